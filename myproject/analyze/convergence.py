@@ -8,8 +8,8 @@ from matplotlib import ticker
 
 from myproject.analyze.common_definitions import COLORS_METAHEURISTICS, STYLES_TUNERS
 
-from myproject.helpers import cmhrun_fname
-from myproject.helpers import get_tuned_convergence_data
+from myproject.convstore import read_convdata
+from myproject.helpers import get_tuned_convergence_data, mean_convergence
 from myproject.helpers import BASE_TERM, DEF_CFGS
 
 legend_handles = [
@@ -26,8 +26,7 @@ metaheuristics = ['SA', 'ACO', 'GA']
 levals = [0, 1000, 10000, 100000]
 
 def plot_data(axes, df: pd.DataFrame, tuner: str, algorithm: str, ):
-    grouped_by_evals = df.groupby('evals')
-    conv = grouped_by_evals.mean()
+    conv = mean_convergence(df)
     label = '{}'.format(algorithm) if tuner == None else '{} + {}'.format(algorithm, tuner)
     if tuner != None:
         axes.plot(conv.index, conv.qualdev, label = label, color = COLORS_METAHEURISTICS[algorithm], linestyle = STYLES_TUNERS[tuner], alpha = 0.7, linewidth = 3)
@@ -43,13 +42,12 @@ for i, evals in enumerate(levals):
     if evals == 0:
         for metaheuristic in metaheuristics:
             title = 'Convergence with default parameters'.format(evals)
-            mhrun_fname = cmhrun_fname(algorithm = metaheuristic, config = DEF_CFGS[metaheuristic], terminate = BASE_TERM, optimize = 'qualdev')
-            df = pd.read_csv('myproject/data/conv/' + mhrun_fname + '.csv')
+            df = read_convdata(metaheuristic, DEF_CFGS[metaheuristic], BASE_TERM, columns = ['qualdev', 'evals', 'time'])
             plot_data(ax[i], df, None, metaheuristic)
 
     else:
         for tuner_mh in itertools.product(tuners, metaheuristics):
-            df = get_tuned_convergence_data({'qualdev': 0.0, 'evals': evals}, tuner_mh[0], tuner_mh[1], 'qualdev')
+            df = get_tuned_convergence_data({'qualdev': 0.0, 'evals': evals}, tuner_mh[0], tuner_mh[1], 'qualdev', columns = ['qualdev', 'evals', 'time'])
             plot_data(ax[i], df, tuner_mh[0], tuner_mh[1])
         
     # visual stuff...
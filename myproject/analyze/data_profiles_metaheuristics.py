@@ -7,7 +7,8 @@ import matplotlib.pyplot as plt
 from matplotlib import ticker
 import matplotlib.lines as mlines
 
-from myproject.helpers import cmhrun_fname, mhrun_fname_from_tuning_data
+from myproject.helpers import config_from_tuning_data
+from myproject.catalog import read_results
 from myproject.helpers import BASE_TERM, DEF_CFGS
 from myproject.analyze.common_definitions import COLORS_METAHEURISTICS, STYLES_TUNERS
 
@@ -44,14 +45,13 @@ for i, terminate in enumerate(termination_conditions):
     for metaheuristic in metaheuristics:
         # plot untuned metaheuristic
         print("Plot " + metaheuristic + ' without tuning ')
-        mhrun_fname = cmhrun_fname(metaheuristic, DEF_CFGS[metaheuristic], terminate)
-        mhrun_results = pd.read_csv('myproject/data/results/' + mhrun_fname + '.csv')
+        mhrun_results = read_results(metaheuristic, DEF_CFGS[metaheuristic], terminate, columns = [optimize])
         plot(mhrun_results, ax[i], metaheuristic, 'notuner', optimize)
 
         for tuner in tuners:
             print("Plot " + metaheuristic + ' tuned with ' + tuner)
-            mhrun_fname = mhrun_fname_from_tuning_data(terminate, tuner, metaheuristic, optimize)
-            mhrun_results = pd.read_csv('myproject/data/results/' + mhrun_fname + '.csv')
+            config = config_from_tuning_data(terminate, tuner, metaheuristic, optimize)
+            mhrun_results = read_results(metaheuristic, config, BASE_TERM, columns = [optimize])
             plot(mhrun_results, ax[i], metaheuristic, tuner, optimize)
 
     ax[i].set(xscale = 'log', xlim = [0.0001, 5], ylim = [0, 1])
@@ -1,4 +1,5 @@
-from myproject.helpers import BASE_TERM, DEF_CFGS, cmhrun_fname
+from myproject.helpers import BASE_TERM, DEF_CFGS, mean_convergence
+from myproject.convstore import read_convdata
 import pandas as pd
 
 import matplotlib.pyplot as plt
@@ -17,8 +18,7 @@ fig, ax = plt.subplots()
 for algorithm, config in DEF_CFGS.items():
     
     # linear regression time -> evals
-    fname = cmhrun_fname(algorithm, config, BASE_TERM)
-    df = pd.read_csv('myproject/data/conv/' + fname + '.csv')
+    df = read_convdata(algorithm, config, BASE_TERM, columns = ['evals', 'time'])
     x = df.time.values.reshape(-1, 1)
     y = df.evals.values.reshape(-1, 1)
     model = LinearRegression().fit(x, y)
@@ -33,8 +33,7 @@ for algorithm, config in DEF_CFGS.items():
     time2evals['coefficient'].append(coefficient)
     
     # scatter plot
-    grouped_by_evals = df.groupby('evals')
-    evals_mean_time = grouped_by_evals.mean()
+    evals_mean_time = mean_convergence(df)
     ax.scatter(evals_mean_time.time, evals_mean_time.index, label = algorithm)
     
 # save model values
@@ -10,7 +10,8 @@ import matplotlib.patches as mpatches
 
 from myproject.analyze.common_definitions import COLORS_TUNEDTO, MARKERS_METAHEURISTICS
 
-from myproject.helpers import cmhrun_fname, get_tuned_convergence_data
+from myproject.convstore import read_convdata
+from myproject.helpers import get_tuned_convergence_data, mean_convergence
 from myproject.helpers import BASE_TERM, DEF_CFGS
 
 legend_handles = [
@@ -37,12 +38,11 @@ for constellation in itertools.product(levals, metaheuristics, tuners):
     conv = None
     if constellation[0] == 0:
         metaheuristic = constellation[1]
-        mhrun_fname = cmhrun_fname(metaheuristic, DEF_CFGS[metaheuristic], BASE_TERM, optimize)
-        conv = pd.read_csv('myproject/data/conv/' + mhrun_fname + '.csv')
+        conv = read_convdata(metaheuristic, DEF_CFGS[metaheuristic], BASE_TERM, columns = ['qualdev', 'evals', 'time'])
     else: 
         conv = get_tuned_convergence_data(terminate = {'qualdev': 0.0, 'evals': constellation[0]}, 
-            tuner = constellation[2], metaheuristic = constellation[1], optimize = optimize)
-    qd_means = conv.groupby('evals').mean()
+            tuner = constellation[2], metaheuristic = constellation[1], optimize = optimize, columns = ['qualdev', 'evals', 'time'])
+    qd_means = mean_convergence(conv)
 
     # interpolate in case eval points were skipped over in metaheuristic
     all_eval_points = list(range(1, 100002))
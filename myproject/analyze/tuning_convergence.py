@@ -1,10 +1,10 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib import ticker
 import matplotlib.lines as mlines
 
 from myproject.analyze.common_definitions import COLORS_METAHEURISTICS, STYLES_TUNERS
-from myproject.helpers import tun_conv, cmhrun_fname
+from myproject.helpers import tun_conv
+from myproject.catalog import read_results
 from myproject.helpers import DEF_CFGS, BASE_TERM
 
 legend_handles = [
@@ -25,9 +25,8 @@ fig, ax = plt.subplots(nrows = 3, ncols = 1, sharey = 'all', sharex = 'all', fig
 
 for i, qd_term_factor in enumerate(qd_term_factors):
     for metaheuristic in metaheuristics:
-        mhrun_fname = cmhrun_fname(metaheuristic, DEF_CFGS[metaheuristic], BASE_TERM)
-        mhrun_results = pd.read_csv('myproject/data/results/' + mhrun_fname + '.csv')
-        default_qualdev = round(mhrun_results.mean()['qualdev'], 15) * qd_term_factor
+        mhrun_results = read_results(metaheuristic, DEF_CFGS[metaheuristic], BASE_TERM, columns = ['qualdev'])
+        default_qualdev = round(mhrun_results['qualdev'].mean(), 15) * qd_term_factor
         terminate = {'qualdev': default_qualdev, 'evals': 100000}
 
         for tuner in ['irace', 'smac']:
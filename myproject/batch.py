@@ -0,0 +1,61 @@
+###############################################################################
+# Evaluates batches of metaheuristic runs (algorithm, configuration,
+# termination condition, instance, seed) over a pool of worker processes.
+# Jobs on the same instance are run by the same worker one after the other,
+# so every worker loads an instance only once.
+###############################################################################
+
+from pathlib import Path
+from collections import namedtuple
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from myproject.catalog import normalize_params
+from myproject.target_runner import run_algorithm
+
+Job = namedtuple('Job', 'algorithm config terminate instance seed')
+
+BATCH_COLUMNS = ['algorithm', 'config', 'terminate', 'instance', 'seed', 'qualdev', 'evals', 'time']
+
+def run_job(job: Job) -> dict:
+    return run_algorithm(job.algorithm, job.instance, job.config, job.terminate, seed = job.seed)
+
+def run_jobs(indexed_jobs: list) -> list:
+    return [(idx, run_job(job)) for idx, job in indexed_jobs]
+
+# splits the jobs into groups with the same instance, big groups get split up to keep all workers busy
+def group_by_instance(jobs: list, workers: int) -> list:
+    groups = {}
+    for idx, job in enumerate(jobs):
+        groups.setdefault(str(Path(job.instance).absolute()), []).append((idx, job))
+
+    maxsize = max(1, -(-len(jobs) // workers))
+    return [group[start:start + maxsize] for group in groups.values() for start in range(0, len(group), maxsize)]
+
+def run_batch(jobs: list, workers: int = 1) -> pd.DataFrame:
+    groups = group_by_instance(jobs, workers)
+
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            grouped_results = pool.map(run_jobs, groups, chunksize = 1)
+    else:
+        grouped_results = [run_jobs(group) for group in groups]
+
+    # back into job order
+    results = [None] * len(jobs)
+    for idx, result in (indexed for group in grouped_results for indexed in group):
+        results[idx] = result
+
+    return pd.DataFrame({
+        'algorithm': [job.algorithm for job in jobs],
+        'config': [normalize_params(job.config) for job in jobs],
+        'terminate': [normalize_params(job.terminate) for job in jobs],
+        'instance': [Path(job.instance).name for job in jobs],
+        # seeds may be None or wider than 64 bits (e.g. SeedSequence entropy)
+        'seed': pd.Series([job.seed for job in jobs], dtype = object),
+        'qualdev': np.array([result['qualdev'] for result in results], dtype = float),
+        'evals': np.array([result['evals'] for result in results], dtype = np.int64),
+        'time': np.array([result['time'] for result in results], dtype = float)
+    }, columns = BATCH_COLUMNS)
@@ -0,0 +1,41 @@
+# reports the startup cost of the scripts the tuners spawn for every target run:
+# wall clock time of importing each entry point in a fresh interpreter and the slowest imports (python -X importtime)
+
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ['myproject.target_runner', 'myproject.target_runner_client', 'myproject.tuning_wrapper']
+REPETITIONS = 10
+
+def spawn_time(module: str) -> float:
+    code = 'pass' if module == None else 'import ' + module
+    starttime = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check = True)
+    return time.perf_counter() - starttime
+
+def slowest_imports(module: str, count: int = 10) -> list:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], capture_output = True, text = True, check = True)
+
+    # lines look like 'import time:  self [us] | cumulative | imported package'
+    imports = []
+    for line in result.stderr.splitlines()[1:]:
+        fields = line.split('|')
+        imports.append((int(fields[1]), fields[2].strip()))
+    imports.sort(reverse = True)
+    return imports[:count]
+
+if __name__=='__main__':
+    baseline = statistics.median([spawn_time(None) for _ in range(REPETITIONS)])
+    print('interpreter startup: %.1f ms' % (baseline * 1000))
+
+    for module in ENTRY_POINTS:
+        try:
+            median = statistics.median([spawn_time(module) for _ in range(REPETITIONS)])
+        except subprocess.CalledProcessError:
+            print('\n%s: import failed' % module)
+            continue
+        print('\n%s: %.1f ms (%.1f ms for imports)' % (module, median * 1000, (median - baseline) * 1000))
+        for cumulative, name in slowest_imports(module):
+            print('    %8.1f ms  %s' % (cumulative / 1000, name))
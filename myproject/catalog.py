@@ -0,0 +1,137 @@
+###############################################################################
+# SQLite catalog of metaheuristic run results. Every run is one row with the
+# algorithm, the normalized configuration and termination condition, the
+# instance, seed and tuning budget and the achieved qualdev, evals and time.
+#
+# Configurations and termination conditions are stored as json with sorted
+# keys, so the same parameters always map to the same text no matter the
+# order or the length of their float values.
+###############################################################################
+
+from pathlib import Path
+import json
+import sqlite3
+
+CATALOG_PATH = Path('myproject/data/results.sqlite')
+RESULTS_DIR = Path('myproject/data/results')
+RESULT_COLUMNS = ['algorithm', 'config', 'terminate', 'instance', 'seed', 'tuning_budget', 'qualdev', 'evals', 'time']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    algorithm TEXT NOT NULL,
+    config TEXT NOT NULL,
+    terminate TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    seed INTEGER,
+    tuning_budget INTEGER,
+    qualdev REAL,
+    evals INTEGER,
+    time REAL
+);
+CREATE INDEX IF NOT EXISTS runs_experiment ON runs (algorithm, config, terminate);
+CREATE INDEX IF NOT EXISTS runs_instance ON runs (instance);
+'''
+
+def normalize_params(params: dict) -> str:
+    return json.dumps(params, sort_keys = True, default = str)
+
+def connect(path: Path = CATALOG_PATH) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents = True, exist_ok = True)
+    # parallel tuner processes may write at the same time, wait for their locks instead of failing
+    connection = sqlite3.connect(str(path), timeout = 60)
+    connection.executescript(SCHEMA)
+    return connection
+
+# inserts the results of many runs of one algorithm, configuration and termination condition in one transaction,
+# a result is a dict (or namedtuple) with instance, qualdev, evals, time and optionally seed and tuning_budget
+def insert_runs(algorithm: str, config: dict, terminate: dict, results: list, path: Path = CATALOG_PATH) -> int:
+    config, terminate = normalize_params(config), normalize_params(terminate)
+    rows = []
+    for result in results:
+        result = result._asdict() if hasattr(result, '_asdict') else result
+        seed, tuning_budget = result.get('seed'), result.get('tuning_budget')
+        rows.append((algorithm, config, terminate, Path(result['instance']).name,
+                        None if seed == None else int(seed), None if tuning_budget == None else int(tuning_budget),
+                        float(result['qualdev']), int(result['evals']), float(result['time'])))
+
+    connection = connect(path)
+    try:
+        with connection:
+            connection.executemany('INSERT INTO runs (' + ', '.join(RESULT_COLUMNS) + ') VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    finally:
+        connection.close()
+    return len(rows)
+
+def where_clause(algorithm: str = None, config: dict = None, terminate: dict = None, instances: list = None) -> tuple:
+    conditions, values = [], []
+    for column, value in [('algorithm', algorithm), ('config', config), ('terminate', terminate)]:
+        if value != None:
+            conditions.append(column + ' = ?')
+            values.append(value if column == 'algorithm' else normalize_params(value))
+    if instances != None:
+        conditions.append('instance IN (' + ', '.join('?' * len(instances)) + ')')
+        values.extend(Path(instance).name for instance in instances)
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), values
+
+def has_runs(algorithm: str, config: dict, terminate: dict, path: Path = CATALOG_PATH) -> bool:
+    if not Path(path).exists():
+        return False
+    where, values = where_clause(algorithm, config, terminate)
+    connection = connect(path)
+    try:
+        return connection.execute('SELECT 1 FROM runs' + where + ' LIMIT 1', values).fetchone() != None
+    finally:
+        connection.close()
+
+# mean of a result column over all runs of an algorithm with a configuration and termination condition
+def mean_result(algorithm: str, config: dict, terminate: dict, column: str, path: Path = CATALOG_PATH) -> float:
+    if column not in ['qualdev', 'evals', 'time']:
+        raise ValueError('No result column: "' + column + '"')
+
+    where, values = where_clause(algorithm, config, terminate)
+    connection = connect(path)
+    try:
+        mean = connection.execute('SELECT AVG(' + column + ') FROM runs' + where, values).fetchone()[0]
+    finally:
+        connection.close()
+    return float('nan') if mean == None else mean
+
+def query_runs(algorithm: str = None, config: dict = None, terminate: dict = None, instances: list = None,
+                columns: list = None, path: Path = CATALOG_PATH) -> 'pd.DataFrame':
+    import pandas as pd
+
+    columns = RESULT_COLUMNS if columns == None else columns
+    unknown = [column for column in columns if column not in RESULT_COLUMNS]
+    if len(unknown) > 0:
+        raise ValueError('No result columns: ' + str(unknown))
+
+    where, values = where_clause(algorithm, config, terminate, instances)
+    connection = connect(path)
+    try:
+        return pd.read_sql_query('SELECT ' + ', '.join(columns) + ' FROM runs' + where + ' ORDER BY id', connection, params = values)
+    finally:
+        connection.close()
+
+# results of an algorithm with a configuration and termination condition,
+# falls back to the result csv files written before the catalog
+def read_results(algorithm: str, config: dict, terminate: dict, columns: list = None, path: Path = CATALOG_PATH) -> 'pd.DataFrame':
+    import pandas as pd
+    from myproject.helpers import cmhrun_fname
+
+    if has_runs(algorithm, config, terminate, path):
+        return query_runs(algorithm, config, terminate, columns = columns, path = path)
+
+    results = pd.read_csv(RESULTS_DIR / (cmhrun_fname(algorithm, config, terminate) + '.csv'))
+    return results if columns == None else results[[column for column in columns if column in results]]
+
+# moves a result csv file of the old file name scheme into the catalog
+def import_results_csv(algorithm: str, config: dict, terminate: dict, path: Path = CATALOG_PATH) -> int:
+    import pandas as pd
+    from myproject.helpers import cmhrun_fname
+
+    results = pd.read_csv(RESULTS_DIR / (cmhrun_fname(algorithm, config, terminate) + '.csv'))
+    for column in ['qualdev', 'evals', 'time']:
+        results[column] = pd.to_numeric(results[column], errors = 'coerce')
+    results = results.dropna(subset = ['qualdev', 'evals', 'time'])
+    return insert_runs(algorithm, config, terminate, results.to_dict('records'), path)
@@ -0,0 +1,95 @@
+###############################################################################
+# Columnar storage for metaheuristic convergence data. Every run is saved as
+# one .npz file with a typed array per column, partitioned into folders by
+# algorithm, configuration and termination condition:
+#
+#   myproject/data/conv/algorithm=SA/config=<hash>/terminate=<hash>/<instance>-<id>.npz
+#
+# Each partition folder also holds a partition.json with the readable
+# configuration and termination condition.
+###############################################################################
+
+from pathlib import Path
+import hashlib
+import itertools
+import json
+import time
+import uuid
+
+import numpy as np
+
+from myproject.catalog import normalize_params
+
+CONV_DIR = Path('myproject/data/conv')
+CONV_COLUMNS = {'qualdev': np.float64, 'evals': np.int64, 'time': np.float64}
+
+# runs written by this process, orders runs that are written within the same clock tick
+RUN_COUNTER = itertools.count()
+
+# the same normalization as the results catalog and the run cache, nested dicts are sorted as well
+def partition_key(params: dict) -> str:
+    return hashlib.sha1(normalize_params(params).encode()).hexdigest()[:16]
+
+def partition_dir(algorithm: str, config: dict, terminate: dict, conv_dir: Path = CONV_DIR) -> Path:
+    return Path(conv_dir) / ('algorithm=' + algorithm) / ('config=' + partition_key(config)) / ('terminate=' + partition_key(terminate))
+
+def create_partition(algorithm: str, config: dict, terminate: dict, conv_dir: Path = CONV_DIR) -> Path:
+    folder = partition_dir(algorithm, config, terminate, conv_dir)
+    folder.mkdir(parents = True, exist_ok = True)
+    fpartition = folder / 'partition.json'
+    if not fpartition.exists():
+        fpartition.write_text(json.dumps({'algorithm': algorithm, 'config': config, 'terminate': terminate}, default = str))
+    return folder
+
+def write_run(folder: Path, instance: str, qualdevs: np.ndarray, evals: np.ndarray, times: np.ndarray) -> Path:
+    Path(folder).mkdir(parents = True, exist_ok = True)
+
+    # file names have to be unique across parallel runs and the sa chains of one process,
+    # the order of the runs is saved with them
+    fname = Path(folder) / '{}-{}.npz'.format(Path(instance).stem, uuid.uuid4().hex)
+    np.savez(fname, instance = np.array(instance), order = np.array([time.time_ns(), next(RUN_COUNTER)], dtype = np.int64),
+        qualdev = np.asarray(qualdevs, dtype = np.float64), evals = np.asarray(evals, dtype = np.int64), time = np.asarray(times, dtype = np.float64))
+    return fname
+
+# reads the runs of one partition into a data frame, only loading the given columns
+def read_partition(folder: Path, columns: list = None, instances: list = None) -> 'pd.DataFrame':
+    import pandas as pd
+
+    columns = list(CONV_COLUMNS) if columns == None else columns
+    runs = []
+    for frun in Path(folder).glob('*.npz'):
+        with np.load(frun) as run:
+            instance = str(run['instance'])
+            if instances != None and instance not in instances:
+                continue
+            # runs written before the order field are named <instance>-<time_ns>-<pid>
+            order = tuple(run['order'].tolist()) if 'order' in run else (int(frun.stem.split('-')[-2]), 0)
+            runs.append((order, instance, {column: run[column] for column in columns}))
+
+    frames = []
+    for _, instance, data in sorted(runs, key = lambda run: run[0]):
+        frames.append(pd.DataFrame({'instance': np.repeat(instance, len(data[columns[0]])), 'run': len(frames), **data}))
+
+    if len(frames) == 0:
+        return pd.DataFrame({'instance': pd.Series(dtype = str), 'run': pd.Series(dtype = np.int64),
+                                **{column: pd.Series(dtype = CONV_COLUMNS[column]) for column in columns}})
+    conv = pd.concat(frames, ignore_index = True)
+    conv['instance'] = conv['instance'].astype('category')
+    return conv
+
+# reads the convergence data of all runs of an algorithm with a configuration and termination condition,
+# falls back to the convergence csv files written before the columnar storage
+def read_convdata(algorithm: str, config: dict, terminate: dict, columns: list = None, instances: list = None,
+                    conv_dir: Path = CONV_DIR) -> 'pd.DataFrame':
+    import pandas as pd
+    from myproject.helpers import cmhrun_fname
+
+    folder = partition_dir(algorithm, config, terminate, conv_dir)
+    if folder.exists():
+        return read_partition(folder, columns, instances)
+
+    usecols = None if columns == None else ['instance'] + columns
+    conv = pd.read_csv(Path(conv_dir) / (cmhrun_fname(algorithm, config, terminate) + '.csv'), usecols = usecols)
+    if instances != None:
+        conv = conv.loc[conv['instance'].isin(instances)]
+    return conv
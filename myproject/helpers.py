@@ -4,9 +4,8 @@ import sys
 import datetime
 
 import numpy as np
-import pandas as pd
-from rpy2 import robjects
-import tsplib95
+
+# pandas, rpy2 and tsplib95 are imported where they are needed, target runs only need the parameter transformations
 
 # default termination condition and default parameter configurations
 
@@ -33,17 +32,27 @@ VALID_PARAMETERS = [
     'beta',                 
     'pbest',                    
     'evaporation',
+    'cand_list_size',
     'popsize',
     'mut_rate',
     'rank_weight',
+    'offspring',
     'term_evals',
     'term_evals_val',
     'term_qualdev',
     'term_qualdev_val',
+    'term_time',
+    'term_time_val',
+    'term_noimprovement',
+    'term_noimpr_temp_val',
+    'term_noimpr_accp_val',
+    'term_noimpr_gen_val',
     'optimize'
 ]
 
 def calc_mean_std(instancefolder: str):
+    import tsplib95
+
     entries = Path(instancefolder)
     stds = []
     for entry in entries.iterdir():
@@ -56,13 +65,13 @@ def calc_mean_std(instancefolder: str):
         stds.append(np.array(distances).std())
     return np.array(stds).mean()
 
-def def_cfg_sa(problem: tsplib95.models.StandardProblem) -> dict:
+def def_cfg_sa(problem: 'tsplib95.models.StandardProblem') -> dict:
     distances = [problem.get_weight(edge[0], edge[1]) for edge in problem.get_edges()]
     initial_temperature = -np.array(distances).std() / math.log(0.47)
     repetitions = problem.dimension * (problem.dimension - 1)
     return {'initial_temperature': initial_temperature, 'repetitions': repetitions, 'cooling_factor': 0.95}
 
-def def_cfg_aco(problem: tsplib95.models.StandardProblem) -> dict:
+def def_cfg_aco(problem: 'tsplib95.models.StandardProblem') -> dict:
     antcount = problem.dimension
     return {'antcount': antcount, 'alpha': 1, 'beta': 2, 'evaporation': 0.98, 'pbest': 0.05}
 
@@ -80,6 +89,8 @@ def config_to_cand_params_smac(configuration: str) -> list:
     return list(np.array(cand_params).flatten())
 
 def tun_fname_irace_to_cand_params(tun_fname: str) -> list: # TODO
+    from rpy2 import robjects
+
     tun_fname = 'myproject/data/irace/' + tun_fname + '.Rdata'
     robjects.r("library('irace')")
     robjects.r('load("{}")'.format(tun_fname))
@@ -129,10 +140,14 @@ def params2dict(cand_params: list) -> dict:
         params_as_dict['beta'] = float(params_as_dict['beta'])
         params_as_dict['pbest'] = float(params_as_dict['pbest'])
         params_as_dict['evaporation'] = float(params_as_dict['evaporation'])
+        if 'cand_list_size' in params_as_dict:
+            params_as_dict['cand_list_size'] = int(float(params_as_dict['cand_list_size']))
     elif params_as_dict['algorithm'] == 'GA':
         params_as_dict['popsize'] = int(float(params_as_dict['popsize']))
         params_as_dict['mut_rate'] = float(params_as_dict['mut_rate'])
         params_as_dict['rank_weight'] = float(params_as_dict['rank_weight'])
+        if 'offspring' in params_as_dict:
+            params_as_dict['offspring'] = int(float(params_as_dict['offspring']))
 
     return params_as_dict
 
@@ -154,15 +169,21 @@ def separate_cfg_term_opt(params: dict) -> tuple:
                 cfg.pop('term_time')
             if key == 'term_noimprovement' and cfg[key] == 'True':
                 terminate['noimprovement'] = {}
-                terminate['noimprovement']['temperatures'] = float(cfg.pop('term_noimpr_temp_val'))
-                terminate['noimprovement']['accportion'] = float(cfg.pop('term_noimpr_accp_val'))
+                if 'term_noimpr_temp_val' in cfg:
+                    terminate['noimprovement']['temperatures'] = float(cfg.pop('term_noimpr_temp_val'))
+                if 'term_noimpr_accp_val' in cfg:
+                    terminate['noimprovement']['accportion'] = float(cfg.pop('term_noimpr_accp_val'))
+                if 'term_noimpr_gen_val' in cfg:
+                    terminate['noimprovement']['generations'] = int(cfg.pop('term_noimpr_gen_val'))
                 cfg.pop('term_noimprovement')             
     return cfg, terminate, optimize
 
 
 ### build tuning convergence dataframe ###
     
-def incumbents_smac(fname: str) -> pd.DataFrame:
+def incumbents_smac(fname: str) -> 'pd.DataFrame':
+    import pandas as pd
+
     folder = Path('myproject/data/smac/' + fname + '/NoScenarioFile')
     subfolder = list(filter(lambda file: 'state-run' in file.name, folder.iterdir()))[0]
     fname_run_results = list(filter(lambda file: 'runs_and_results-it' in file.name, subfolder.iterdir()))[0]
@@ -189,7 +210,10 @@ def incumbents_smac(fname: str) -> pd.DataFrame:
         
     return incumbents
 
-def elite_results_smac(tuning_budget: int, algorithm: str, terminate: dict, optimize: str, suffix: str) -> pd.DataFrame:
+def elite_results_smac(tuning_budget: int, algorithm: str, terminate: dict, optimize: str, suffix: str) -> 'pd.DataFrame':
+    import pandas as pd
+    from myproject.catalog import read_results
+
     tun_fname = ctun_fname(tuning_budget, algorithm, terminate, optimize, suffix)
 
     # load incumbents with configurations
@@ -202,15 +226,16 @@ def elite_results_smac(tuning_budget: int, algorithm: str, terminate: dict, opti
         cand_params = config_to_cand_params_smac(string_configuration_smac)
         algorithm, config, terminate, optimize = from_cand_params(cand_params)
 
-        mhrun_fname = cmhrun_fname(algorithm, config, terminate)
-        mhrun_results = pd.read_csv('myproject/data/results/' + mhrun_fname + '.csv')
+        mhrun_results = read_results(algorithm, config, terminate, columns = [optimize])
         incumbent_qualities.append(pd.to_numeric(mhrun_results[optimize], errors = 'coerce').mean())
 
     elite_results = incumbents[['runs']].copy()
     elite_results[optimize] = incumbent_qualities
     return elite_results
 
-def elite_results_irace(tuning_budget: int, algorithm: str, terminate: dict, optimize: str, suffix: str) -> pd.DataFrame:
+def elite_results_irace(tuning_budget: int, algorithm: str, terminate: dict, optimize: str, suffix: str) -> 'pd.DataFrame':
+    import pandas as pd
+
     fname = 'myproject/data/irace/' + ctun_fname(tuning_budget, algorithm, terminate, optimize, suffix)
     fiterations = fname + '-iterations.csv'
     ftest_experiments = fname + '-test-experiments.csv'
@@ -225,12 +250,14 @@ def elite_results_irace(tuning_budget: int, algorithm: str, terminate: dict, opt
     return elite_results
 
 def tun_conv(tuner: str, tuning_budget: int, algorithm: str, terminate: dict, optimize: str, suffix: str = ''):
+    import pandas as pd
+    from myproject.catalog import read_results
+
     elite_results = elite_results_irace(tuning_budget, algorithm, terminate, optimize, suffix) if tuner == 'irace' \
         else elite_results_smac(tuning_budget, algorithm, terminate, optimize, suffix)
     
     # get default result
-    mhrun_fname = cmhrun_fname(algorithm, DEF_CFGS[algorithm], terminate)
-    mhrun_results = pd.read_csv('myproject/data/results/' + mhrun_fname + '.csv')
+    mhrun_results = read_results(algorithm, DEF_CFGS[algorithm], terminate, columns = [optimize])
     mhrun_results[optimize] = pd.to_numeric(mhrun_results[optimize], errors = 'coerce')
     default_result = mhrun_results[optimize].mean()
 
@@ -249,7 +276,7 @@ def tun_conv(tuner: str, tuning_budget: int, algorithm: str, terminate: dict, op
     traj[optimize] = traj[optimize] / default_result
     return traj
 
-def mhrun_fname_from_tuning_data(terminate: dict, tuner: str, metaheuristic: str, optimize: str) -> str:
+def config_from_tuning_data(terminate: dict, tuner: str, metaheuristic: str, optimize: str) -> dict:
     tfname = ctun_fname(tuning_budget = 5000, algorithm = metaheuristic, terminate = terminate, optimize = optimize)
 
     cand_params = None
@@ -260,9 +287,27 @@ def mhrun_fname_from_tuning_data(terminate: dict, tuner: str, metaheuristic: str
     if tuner == 'irace':
         cand_params = tun_fname_irace_to_cand_params(tfname)        
     alg, config, term, opt = from_cand_params(cand_params)
+    return config
+
+def mhrun_fname_from_tuning_data(terminate: dict, tuner: str, metaheuristic: str, optimize: str) -> str:
+    config = config_from_tuning_data(terminate, tuner, metaheuristic, optimize)
     mhrun_fname = cmhrun_fname(metaheuristic, config, BASE_TERM)
     return mhrun_fname
 
-def get_tuned_convergence_data(terminate: dict, tuner: str, metaheuristic: str, optimize: str) -> pd.DataFrame:
-    mhrun_fname = mhrun_fname_from_tuning_data(terminate, tuner, metaheuristic, optimize)
-    return pd.read_csv('myproject/data/conv/' + mhrun_fname + '.csv')
\ No newline at end of file
+def get_tuned_convergence_data(terminate: dict, tuner: str, metaheuristic: str, optimize: str, columns: list = None) -> 'pd.DataFrame':
+    from myproject.convstore import read_convdata
+
+    config = config_from_tuning_data(terminate, tuner, metaheuristic, optimize)
+    return read_convdata(metaheuristic, config, BASE_TERM, columns)
+
+# mean convergence over all runs in a convergence data frame, runs only record improvements and grid points,
+# so every run keeps its last recorded state until its next record
+def mean_convergence(conv: 'pd.DataFrame') -> 'pd.DataFrame':
+    import pandas as pd
+
+    # csv files have the runs one after the other, a new run starts when the evals drop
+    if 'run' not in conv:
+        conv = conv.assign(run = (conv['evals'].diff() <= 0).cumsum())
+    columns = [column for column in ['qualdev', 'time'] if column in conv]
+    return pd.DataFrame({column: conv.pivot_table(index = 'evals', columns = 'run', values = column).ffill().mean(axis = 1) 
+                            for column in columns})
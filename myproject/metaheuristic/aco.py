@@ -1,121 +1,183 @@
 from pathlib import Path
-import random
 import time
-from operator import attrgetter
 
 import numpy as np
-import pandas as pd
 
-import tsplib95
-from myproject.metaheuristic.commons import Solution, Convdata
-
-def constructAntSolution(problem: tsplib95.models.StandardProblem, weights: np.array) -> Solution:
-    allnodes = list(problem.get_nodes())
-    cweights = weights.copy()
-
-    # start tour
-    tour = [random.choice(allnodes)]
-
-    # finish tour
-    while len(tour) < len(allnodes):
-
-        # helper variables
-        current_node = tour[-1]
-        cweights[:,current_node-1] = 0
-        cweights_slice = cweights[current_node-1]
-
-        if (cweights_slice == 0).all(): 
-            tour.append(random.choice( list( set(allnodes) - set(tour)) ))
-            continue
-
-        # select move
-        node = random.choices(allnodes, weights = list(cweights_slice), k = 1)[0]
-        tour.append(node)              
-
-    return Solution(problem.trace_tours([tour])[0], tour)
-
-def updatePheromones(pheromone_matrix: list, evaporation: float, pheromax: float, pheromin: float, ants: list) -> list:
+from myproject.metaheuristic.commons import Solution, create_candidates_list, make_rng
+from myproject.metaheuristic.instance import Instance, load_instance, tour_quality, tours_qualities
+from myproject.metaheuristic.profiler import NULL_PROFILER, make_profiler
+from myproject.metaheuristic.recorder import ConvergenceRecorder
+from myproject.metaheuristic.termination import Termination
+
+# constructs the tours of all ants together, one step for every ant at a time. returns an (antcount x dimension) array.
+# with a candidate list, ants only choose among the candidates of their current node and move to the best unvisited
+# node once all candidates are visited
+def constructColonySolutions(problem: Instance, weights: np.ndarray, antcount: int, rng: np.random.Generator,
+                                candidates: np.ndarray = None) -> np.ndarray:
+    ants = np.arange(antcount)
+    tours = np.empty((antcount, problem.dimension), dtype = np.int64)
+    visited = np.zeros((antcount, problem.dimension), dtype = bool)
+
+    # start tours
+    tours[:, 0] = rng.integers(problem.dimension, size = antcount)
+    visited[ants, tours[:, 0]] = True
+
+    # finish tours
+    for step in range(1, problem.dimension):
+        current_nodes = tours[:, step - 1]
+
+        # weights of the unvisited nodes (or candidates) from the current nodes of all ants
+        if candidates is None:
+            choices = None
+            cweights = np.where(visited, 0, weights[current_nodes])
+        else:
+            choices = candidates[current_nodes]
+            cweights = np.where(visited[ants[:, np.newaxis], choices], 0, weights[current_nodes[:, np.newaxis], choices])
+        cumweights = np.cumsum(cweights, axis = 1)
+        totals = cumweights[:, -1]
+
+        # select moves by roulette wheel, the first node whose cumulative weight exceeds the drawn value
+        nodes = (cumweights > (rng.random(antcount) * totals)[:, np.newaxis]).argmax(axis = 1)
+        if choices is not None:
+            nodes = choices[ants, nodes]
+
+        # ants without choices move to a random unvisited node (the best unvisited node with a candidate list)
+        stuck = totals <= 0
+        if stuck.any():
+            fallback = rng.random((stuck.sum(), problem.dimension)) if candidates is None else weights[current_nodes[stuck]]
+            nodes[stuck] = np.where(visited[stuck], -1, fallback).argmax(axis = 1)
+
+        tours[:, step] = nodes
+        visited[ants, nodes] = True
+
+    return tours
+
+# edges the pheromones of an ant get deposited on: along the tour and from the first to the last node
+def tourEdges(tour: np.ndarray) -> tuple:
+    tour = np.asarray(tour)
+    return np.append(tour[:-1], tour[0]), np.append(tour[1:], tour[-1])
+
+def updatePheromones(pheromone_matrix: np.ndarray, evaporation: float, pheromax: float, pheromin: float, ants: list) -> np.ndarray:
 
     # pheromone evaporation
     pheromone_matrix *= evaporation
 
     # pheromone adding
     for ant in ants:
-        # add pheromones for last/ first edge
-        firstNode = ant.tour[0]
-        lastNode = ant.tour[-1]
-        pheromone_matrix[firstNode - 1][lastNode - 1] = pheromone_matrix[firstNode - 1][lastNode - 1] + (1 / ant.qual)
+        nfroms, ntos = tourEdges(ant.tour)
+        np.add.at(pheromone_matrix, (nfroms, ntos), 1 / ant.qual)
 
-        # add pheromones for all the other edges
-        for a in range(len(ant.tour) - 1):
-            nodeFrom = ant.tour[a]
-            nodeTo = ant.tour[a+1]
-            pheromone_matrix[nodeFrom - 1][nodeTo - 1] = pheromone_matrix[nodeFrom - 1][nodeTo - 1] + (1 / ant.qual)
-
-    # upper and lower bounds
-    pheromone_matrix[ pheromone_matrix > pheromax ] = pheromax
-    pheromone_matrix[ pheromone_matrix < pheromin ] = pheromin
+    # upper and lower bounds, only the deposited edges can exceed the upper bound, since it never decreases
+    np.maximum(pheromone_matrix, pheromin, out = pheromone_matrix)
+    for ant in ants:
+        nfroms, ntos = tourEdges(ant.tour)
+        pheromone_matrix[nfroms, ntos] = np.minimum(pheromone_matrix[nfroms, ntos], pheromax)
 
     return pheromone_matrix
 
+# keeps the choice info (pheromone**alpha * heuristic) in sync with the pheromones after updatePheromones.
+# the evaporation scales every entry by evaporation**alpha, so only the lower bound and the deposited edges need work,
+# new pheromone bounds (after an improvement) need a full recomputation
+def updateChoiceInfo(choice_info: np.ndarray, pheromone_matrix: np.ndarray, heuristic: np.ndarray, lower_bounds: np.ndarray,
+                        alpha: float, evaporation: float, ants: list) -> np.ndarray:
+    choice_info *= evaporation**alpha
+    np.maximum(choice_info, lower_bounds, out = choice_info)
+
+    for ant in ants:
+        nfroms, ntos = tourEdges(ant.tour)
+        choice_info[nfroms, ntos] = pheromone_matrix[nfroms, ntos]**alpha * heuristic[nfroms, ntos]
+
+    return choice_info
+
 def aco(instance: str, 
         cfg: dict,
         terminate: dict, 
-        fname_convdata: Path = None) -> dict:
+        fname_convdata: Path = None,
+        seed = None,
+        profile: bool = False,
+        fname_cprofile: Path = None,
+        recorder_options: dict = None) -> dict:
     starttime = time.perf_counter()
-    convdata = [] if fname_convdata != None else None
-
-    # problem: tsplib95.models.StandardProblem
-    problem: tsplib95.models.StandardProblem = tsplib95.load(instance)
-    optimaltour: tsplib95.models.StandardProblem = tsplib95.load(Path(instance).with_suffix('.opt.tour').absolute())
-    optimal_quality: int = problem.trace_tours(optimaltour.tours)[0]
-
-    # setup initialization...
-    best = Solution(problem.trace_canonical_tour(), problem.get_nodes())
-    evals, ants = 1, []
-
-    # distance matrix
-    distance_matrix = np.empty((problem.dimension, problem.dimension))
-    for edge in problem.get_edges():
-        distance_matrix[edge[0] - 1][edge[1] - 1] = float(problem.get_weight(edge[0], edge[1]))
-    np.fill_diagonal(distance_matrix, np.inf) # probably unnecessary, since these edges get excluded anyways, but it removes warning
-    distance_matrix[ distance_matrix == 0 ] = 0.1**10 # some distances are zero, which messes up computation
-
-    # pheromones
-    dimroot_pbest = cfg['pbest']**(1/problem.dimension)
-    pheromax = (1 / (1 - cfg['evaporation'])) * (1 / best.qual)
-    pheromin = (pheromax * (1 - dimroot_pbest)) / ((problem.dimension/2 - 1) * dimroot_pbest)
-    pheromone_matrix = np.full((problem.dimension, problem.dimension), float(pheromax))
-
-    while not ('evals' in terminate and evals >= terminate['evals'] \
-        or 'qualdev' in terminate and best.qual <= optimal_quality * (1 + terminate['qualdev']) \
-        or 'time' in terminate and time.perf_counter() - starttime > terminate['time']): 
+    rng = make_rng(seed)
+    profiler = make_profiler(profile, fname_cprofile)
+    profiler.start()
+    with profiler.phase('setup'):
+        # problem: compiled instance
+        problem: Instance = load_instance(instance)
+        optimal_quality: float = problem.optimal_quality
+        recorder = ConvergenceRecorder(fname_convdata, problem.name, optimal_quality, starttime, profiler = profiler, \
+            **({} if recorder_options == None else recorder_options)) \
+            if fname_convdata != None else None
+        termination = Termination(terminate, optimal_quality, starttime)
+
+        # setup initialization...
+        canonical_tour = list(range(problem.dimension))
+        best = Solution(tour_quality(problem.distance_matrix, canonical_tour), canonical_tour)
+        evals = 1
+
+        # distance matrix
+        distance_matrix = problem.distance_matrix.copy()
+        np.fill_diagonal(distance_matrix, np.inf) # probably unnecessary, since these edges get excluded anyways, but it removes warning
+        distance_matrix[ distance_matrix == 0 ] = 0.1**10 # some distances are zero, which messes up computation
+
+        # pheromones
+        dimroot_pbest = cfg['pbest']**(1/problem.dimension)
+        pheromax = (1 / (1 - cfg['evaporation'])) * (1 / best.qual)
+        pheromin = (pheromax * (1 - dimroot_pbest)) / ((problem.dimension/2 - 1) * dimroot_pbest)
+        pheromone_matrix = np.full((problem.dimension, problem.dimension), float(pheromax))
+
+        # the heuristic factor is constant, the choice info and its lower bounds follow the pheromones
+        heuristic = (1 / distance_matrix)**cfg['beta']
+        choice_info = pheromone_matrix**cfg['alpha'] * heuristic
+        lower_pheromin, lower_bounds = None, None
+
+        # nearest neighbour candidate lists restrict the construction steps on big instances, 0 samples from all nodes
+        cand_list_size = cfg.get('cand_list_size', 0)
+        candidates = create_candidates_list(problem, cand_list_size) if 0 < cand_list_size < problem.dimension - 1 else None
+
+    while not termination.done(evals, best.qual): 
     
         # construct ant solutions
-        weights = pheromone_matrix**cfg['alpha'] * (1/distance_matrix)**cfg['beta']
-        ants = [constructAntSolution(problem, weights) for _ in range(cfg['antcount'])]
+        with profiler.phase('construction'):
+            tours = constructColonySolutions(problem, choice_info, cfg['antcount'], rng, candidates)
+        with profiler.phase('evaluation'):
+            quals = tours_qualities(problem.distance_matrix, tours)
         evals += cfg['antcount']
 
-        # update best reached quality (could be done a little bit more speed friendly)
-        itbest = min(ants, key = attrgetter('qual'))
-        if best == None or itbest.qual < best.qual:
+        # update best reached quality
+        itbest_idx = int(quals.argmin())
+        itbest = Solution(float(quals[itbest_idx]), tours[itbest_idx].copy())
+        improved = itbest.qual < best.qual
+        if improved:
             best = itbest
+        termination.generation(improved)
+        profiler.count('iterations')
+        profiler.count('improvements', int(improved))
 
         # update pheromones...
-        pheromone_matrix = updatePheromones(pheromone_matrix, cfg['evaporation'], pheromax, pheromin, [itbest])
+        with profiler.phase('pheromone_update'):
+            pheromone_matrix = updatePheromones(pheromone_matrix, cfg['evaporation'], pheromax, pheromin, [itbest])
+            if pheromin == lower_pheromin:
+                choice_info = updateChoiceInfo(choice_info, pheromone_matrix, heuristic, lower_bounds, cfg['alpha'], cfg['evaporation'], [itbest])
+            else:
+                lower_pheromin, lower_bounds = pheromin, pheromin**cfg['alpha'] * heuristic
+                choice_info = np.power(pheromone_matrix, cfg['alpha'], out = choice_info)
+                choice_info *= heuristic
 
         # update pheromone bounds
         pheromax = (1 / (1 - cfg['evaporation'])) * (1 / best.qual)
         pheromin = (pheromax * (1 - dimroot_pbest)) / ((problem.dimension/2 - 1) * dimroot_pbest)
 
         # save state if convergence data is looked for 
-        if convdata != None:
-            qualdev = (best.qual - optimal_quality) / optimal_quality
-            convdata.append(Convdata(instance.name, qualdev, evals, time.perf_counter() - starttime))
+        if recorder != None:
+            recorder.record(evals, best.qual)
 
         
-    if convdata != None:
-        print_headers: bool = False if fname_convdata.exists() else True
-        pd.DataFrame(convdata).to_csv(fname_convdata.absolute(),  index = None, mode = 'a', header = print_headers)
-
-    return {'qualdev': (best.qual - optimal_quality) / optimal_quality, 'evals': evals, 'time': time.perf_counter() - starttime}
+    if recorder != None:
+        recorder.close(evals, best.qual)
+    profiler.stop()
+
+    result = {'qualdev': (best.qual - optimal_quality) / optimal_quality, 'evals': evals, 'time': time.perf_counter() - starttime}
+    if profiler != NULL_PROFILER:
+        result['profile'] = profiler.result()
+    return result
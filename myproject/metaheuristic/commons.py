@@ -1,89 +1,200 @@
-import tsplib95
-import random
-
 import numpy as np
-from operator import attrgetter, itemgetter
-from collections import namedtuple
-
-Convdata = namedtuple('Convdata', 'instance qualdev evals time')
-Solution = namedtuple('Solution', 'qual tour')
+from collections import namedtuple, deque
 
-def create_candidates_list(problem: tsplib95.models.StandardProblem, cand_list_size: int) -> tuple:
-    candidates_list = {}
-    
-    for nfrom in problem.get_nodes():
-        distances_nto = [(problem.get_weight(nfrom, nto), nto) for nto in problem.get_nodes()]
-        distances_nto.sort()
-        candidates = np.array(distances_nto[1:cand_list_size+1])[:,1]
-        candidates_list[nfrom] = set(candidates)
+from myproject.metaheuristic.instance import Instance
 
-    return candidates_list
+Solution = namedtuple('Solution', 'qual tour')
 
-def get_posmoves_nodes(candidate_list: list) -> list: # converts candidate list into list of tuples of allowed (nfrom, nto) pairings
+# random number generator of a run from a seed (int, SeedSequence or None for fresh entropy) or a Generator
+def make_rng(seed = None) -> np.random.Generator:
+    return np.random.default_rng(seed)
+
+# independent seeds for count streams (workers, chains) derived from the seed of a run
+def spawn_seeds(seed, count: int) -> list:
+    if isinstance(seed, np.random.Generator):
+        seed = np.random.SeedSequence(seed.integers(2**63, size = 4).tolist())
+    elif not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(count)
+
+# candidates_list[node] are the cand_list_size nearest other nodes, sorted by distance
+def create_candidates_list(problem: Instance, cand_list_size: int) -> np.ndarray:
+    distances = problem.distance_matrix.copy()
+    np.fill_diagonal(distances, np.inf)
+    return np.argsort(distances, axis = 1, kind = 'stable')[:, :cand_list_size]
+
+def get_posmoves_nodes(candidate_list: np.ndarray) -> list: # converts candidate list into list of tuples of allowed (nfrom, nto) pairings
     posmoves_nodes = []
-    for nfrom in candidate_list:
-        posmoves_nodes += [(nfrom, nto) for nto in candidate_list[nfrom]]
+    for nfrom, ntos in enumerate(candidate_list.tolist()):
+        posmoves_nodes += [(nfrom, nto) for nto in ntos]
     return posmoves_nodes
 
-def n2opt(tour: list, idx1: int, idx3: int) -> list:
-
-    # decide which segment to reverse
-    revmiddle = True if abs(idx1 - idx3) < (len(tour) / 2) else False
-
-    if revmiddle:
-        return tour[:idx1+1] + tour[idx3:idx1:-1] + tour[idx3+1:]
-    else:
-        if idx3 == len(tour) - 1: # in case of overflow from last to first 
-            return [tour[0]] + tour[idx1+1:idx3+1] + tour[1:idx1+1] 
-        return tour[idx3+1:] + tour[idx1+1:idx3+1] + tour[:idx1+1] # general case
-
-def random_n2opt(tour: list, posmoves_idxs: list) -> list:    
-    move = random.choice(posmoves_idxs)
+# tour backed by a numpy array of node indices, 2-opt moves are applied in place
+class Tour:
+
+    def __init__(self, nodes, track_positions: bool = False):
+        self.nodes = np.array(nodes, dtype = np.int64)
+        self.positions = None
+        if track_positions: # positions[node] is the index of node in the tour
+            self.positions = np.empty_like(self.nodes)
+            self.positions[self.nodes] = np.arange(len(self.nodes))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __getitem__(self, idx):
+        return self.nodes[idx]
+
+    def __lt__(self, other) -> bool: # only needed to order solutions with equal qualities
+        return self.nodes.tolist() < other.nodes.tolist()
+
+    def tolist(self) -> list:
+        return self.nodes.tolist()
+
+    def copy(self) -> 'Tour':
+        tour = Tour.__new__(Tour)
+        tour.nodes = self.nodes.copy()
+        tour.positions = None if self.positions is None else self.positions.copy()
+        return tour
+
+    def n2opt(self, idx1: int, idx3: int) -> 'Tour':
+        dim = len(self.nodes)
+
+        # reverse the shorter one of the two segments, both result in the same cyclic tour
+        if idx3 - idx1 <= dim / 2:
+            idxs = slice(idx1 + 1, idx3 + 1)
+            self.nodes[idxs] = self.nodes[idx3:idx1:-1]
+        else: # segment wraps around from idx3+1 to idx1
+            idxs = np.r_[idx3+1:dim, 0:idx1+1]
+            self.nodes[idxs] = self.nodes[idxs[::-1]]
+
+        if self.positions is not None:
+            self.positions[self.nodes[idxs]] = np.arange(dim)[idxs]
+        return self
+
+# returns the 2-opt neighbour as a new tour and leaves the given tour untouched
+def n2opt(tour: Tour, idx1: int, idx3: int) -> Tour:
+    return tour.copy().n2opt(idx1, idx3)
+
+# change in tour quality when applying n2opt(tour, idx1, idx3), computed from the two removed and two added edges
+def n2opt_delta(distances, tour, idx1: int, idx3: int) -> float:
+    a, b = tour[idx1], tour[idx1 + 1]
+    c, d = tour[idx3], tour[(idx3 + 1) % len(tour)]
+    return distances[a][c] + distances[b][d] - distances[a][b] - distances[c][d]
+
+# matrix of quality changes, entry [idx1, idx3] is the change when applying n2opt(tour, idx1, idx3)
+def n2opt_gains(distance_matrix: np.ndarray, tour: np.ndarray) -> np.ndarray:
+    succ = np.roll(tour, -1)
+    removed = distance_matrix[tour, succ]
+    return distance_matrix[np.ix_(tour, tour)] + distance_matrix[np.ix_(succ, succ)] - removed[:, np.newaxis] - removed[np.newaxis, :]
+
+def random_n2opt(tour: Tour, posmoves_idxs: list, rng: np.random.Generator) -> Tour:    
+    move = posmoves_idxs[rng.integers(len(posmoves_idxs))]
     return n2opt(tour, move[0], move[1])
 
 # improves a given tour via 2-opt iterative improvement local search, returns (local optimum, quality, evals required) tuple
-def iterimprov_2opt(problem: tsplib95.models.StandardProblem, 
+def iterimprov_2opt(problem: Instance, 
                         initsol: Solution,
                         minqual: float,
                         maxevals: int,
-                        mode: str) -> tuple:
+                        mode: str,
+                        cand_list_size: int = 10,
+                        rng: np.random.Generator = None) -> tuple:
 
-    # setup
-    cursol = Solution(initsol.qual, initsol.tour)
+    # setup, the tour is copied since it gets changed in place
+    cursol = Solution(initsol.qual, Tour(initsol.tour.nodes if isinstance(initsol.tour, Tour) else initsol.tour))
     dim = len(cursol.tour)
     evals = 0
     posmoves = [(a, b) for a in range(dim) for b in range(a, dim) if abs(a-b) > 1 and not (a == 0 and b == dim - 1)]
+    if mode == 'best':
+        valid_moves = np.triu(np.ones((dim, dim), dtype = bool), k = 2)
+        valid_moves[0, dim - 1] = False
 
     while evals < maxevals and minqual < cursol.qual:
         if mode == 'best':
-            neighsols = []
-            for move in posmoves:
-                neightour = n2opt(cursol.tour, move[0], move[1])
-                neighsols.append(Solution(problem.trace_tours([neightour])[0], neightour))    
-            evals += len(neighsols)
-            bestneigh = min(neighsols, key = attrgetter('qual'))
-
-            if bestneigh.qual < cursol.qual:
-                cursol = bestneigh
+            # quality changes of all moves at once, moves not in posmoves are masked out
+            gains = np.where(valid_moves, n2opt_gains(problem.distance_matrix, cursol.tour.nodes), np.inf)
+            evals += len(posmoves)
+            idx1, idx3 = np.unravel_index(np.argmin(gains), gains.shape)
+
+            if gains[idx1, idx3] < 0:
+                cursol = Solution(cursol.qual + gains[idx1, idx3], cursol.tour.n2opt(idx1, idx3))
             else:
                 return cursol, evals
 
         elif mode == 'first':
-            rnd_posmoves = posmoves.copy()
-            random.shuffle(rnd_posmoves)
-
+            rng = make_rng() if rng == None else rng
             found = False
-            for move in rnd_posmoves:
-                neighbor = n2opt(cursol.tour, move[0], move[1])
-                neighqual = problem.trace_tours([neighbor])[0]
+            for move in (posmoves[idx] for idx in rng.permutation(len(posmoves)).tolist()):
+                neighqual = cursol.qual + n2opt_delta(problem.distance_matrix, cursol.tour.nodes, move[0], move[1])
                 evals += 1
                 if neighqual < cursol.qual:
-                    cursol = Solution(neighqual, neighbor)
+                    cursol = Solution(neighqual, cursol.tour.n2opt(move[0], move[1]))
                     found = True
                     break
             if not found:
                 return cursol, evals
+        elif mode == 'neighbors':
+            return neighbors_2opt(problem, cursol, minqual, maxevals, cand_list_size)
         else:
             print('No iterative improvement procedure for: \"' + mode + '\"')
 
-    return cursol, evals
\ No newline at end of file
+    return cursol, evals
+
+# 2-opt local search that only tries moves adding an edge between a node and one of its nearest neighbors,
+# nodes whose surroundings have not changed since they last failed to improve are skipped (don't-look bits)
+def neighbors_2opt(problem: Instance, 
+                    initsol: Solution,
+                    minqual: float,
+                    maxevals: int,
+                    cand_list_size: int) -> tuple:
+
+    # setup
+    tour = Tour(initsol.tour.nodes if isinstance(initsol.tour, Tour) else initsol.tour, track_positions = True)
+    qual = initsol.qual
+    dim = len(tour)
+    evals = 0
+    distances = problem.distance_matrix.tolist()
+    candidates = create_candidates_list(problem, cand_list_size).tolist()
+
+    # nodes to look at, a node is queued at most once
+    queue = deque(tour.tolist())
+    queued = [True] * dim
+
+    while queue and evals < maxevals and minqual < qual:
+        a = queue.popleft()
+        queued[a] = False
+
+        for succ in (True, False):
+            # neighbor of a in the given direction, the edge between them gets removed
+            ia = tour.positions[a]
+            b = tour.nodes[(ia + 1) % dim] if succ else tour.nodes[ia - 1]
+            gain_ab = distances[a][b]
+
+            move = None
+            for c in candidates[a]:
+                # candidates are sorted, no later candidate can shorten the tour anymore
+                if distances[a][c] >= gain_ab:
+                    break
+
+                ic = tour.positions[c]
+                d = tour.nodes[(ic + 1) % dim] if succ else tour.nodes[ic - 1]
+                if c == b or d == a:
+                    continue
+
+                evals += 1
+                delta = distances[a][c] + distances[b][d] - gain_ab - distances[c][d]
+                if delta < 0:
+                    move = (ia, ic) if succ else ((ia - 1) % dim, (ic - 1) % dim)
+                    break
+
+            if move != None:
+                tour.n2opt(min(move), max(move))
+                qual += delta
+                for node in (a, b, c, d):
+                    if not queued[node]:
+                        queue.append(node)
+                        queued[node] = True
+                break
+
+    return Solution(qual, tour), evals
@@ -1,129 +1,272 @@
 from pathlib import Path
-import random
 import time
-from operator import attrgetter, itemgetter
-import heapq
+import bisect
+import math
+import multiprocessing
 
 import numpy as np
-import pandas as pd 
 
-import tsplib95
-from myproject.metaheuristic.commons import Solution, Convdata
+from myproject.metaheuristic.commons import Solution, make_rng, spawn_seeds
+from myproject.metaheuristic.instance import Instance, load_instance, tour_quality, tours_qualities
+from myproject.metaheuristic.profiler import NULL_PROFILER, make_profiler
+from myproject.metaheuristic.recorder import ConvergenceRecorder
+from myproject.metaheuristic.termination import Termination
 
-def displacement_mutation(problem: tsplib95.models.StandardProblem, tour: list) -> Solution:    
-    substart = random.randint(0, len(tour)-1)
-    subend = random.randint(substart+1, len(tour))
+# moves a random subtour to a random position, the quality changes by the three removed and three added edges
+def displacement_mutation(problem: Instance, solution: Solution, rng: np.random.Generator) -> Solution:
+    tour = list(solution.tour)
+    substart = int(rng.integers(0, len(tour)))
+    subend = int(rng.integers(substart+1, len(tour) + 1))
 
     subtour = tour[substart:subend]
     newtour = tour[:substart] + tour[subend:]
-    addback = random.randint(0, len(newtour))
+    addback = int(rng.integers(0, len(newtour) + 1))
+    if len(newtour) == 0:
+        return solution
+
+    # close the gap of the subtour, then open the edge at the insertion point
+    distances = problem.distance_matrix
+    before, after = tour[substart - 1], tour[subend % len(tour)]
+    insfrom, insto = newtour[addback - 1], newtour[addback % len(newtour)]
+    delta = distances[before, after] - distances[before, subtour[0]] - distances[subtour[-1], after] \
+        + distances[insfrom, subtour[0]] + distances[subtour[-1], insto] - distances[insfrom, insto]
+
     newtour = newtour[:addback] + subtour + newtour[addback:]
+    return Solution(solution.qual + delta, newtour)
 
-    return Solution(problem.trace_tours([newtour])[0], newtour)
+# fixed-width adjacency table: row node holds its left and right neighbours in both parents, duplicates are -1
+def edge_table(parent1: list, parent2: list) -> np.ndarray:
+    table = np.empty((len(parent1), 4), dtype = np.int64)
+    for col, parent in ((0, np.asarray(parent1)), (2, np.asarray(parent2))):
+        table[parent[1:], col], table[parent[0], col] = parent[:-1], parent[-1]
+        table[parent[:-1], col + 1], table[parent[-1], col + 1] = parent[1:], parent[0]
 
-def neighnodes(tour: list, node: int) -> tuple:
-    idx = tour.index(node)
-    neighleft = tour[idx-1] if idx > 0 else tour[-1]
-    neighright = tour[idx + 1] if idx + 1 < len(tour) else tour[0]
-    return neighleft, neighright
+    for col in range(1, 4):
+        table[(table[:, col, np.newaxis] == table[:, :col]).any(axis = 1), col] = -1
+    return table
 
-def edge_recombination_crossover(problem: tsplib95.models.StandardProblem, parent1: list, parent2: list) -> Solution:
+def edge_recombination_crossover(problem: Instance, parent1: list, parent2: list, rng: np.random.Generator) -> Solution:
     
-    # build adjacency matrix ...
-    edge_map = {}
-    for nnode in problem.get_nodes():
-        neighs1 = neighnodes(parent1, nnode)
-        neighs2 = neighnodes(parent2, nnode)
-        edge_map[nnode] = { neighs1[0], neighs1[1], neighs2[0], neighs2[1] }
-
-    # build new tour ...
-    ntour = []
+    # build adjacency table, edges are symmetric, so a node's neighbours are also the nodes whose rows contain it
+    adjacency = edge_table(parent1, parent2).tolist()
+    counts = [4 - row.count(-1) for row in adjacency]
 
-    # select first node as node with the least entries
-    nnode = None
-    for candidate in edge_map:
-        if not nnode or len(edge_map[candidate]) < len(edge_map[nnode]):
-            nnode = candidate
+    # unvisited nodes, removed by swapping with the last one
+    unvisited = list(range(problem.dimension))
+    unvisited_idxs = list(range(problem.dimension))
+
+    # build new tour, starting with the node with the least entries
+    ntour = []
+    nnode = counts.index(min(counts))
 
     while True:
-        # add node, terminate if tour is finished, remove node from edge map
+        # add node, terminate if tour is finished
         ntour.append(nnode)
-        if len(ntour) == len(parent1):
+        idx, last = unvisited_idxs[nnode], unvisited[-1]
+        unvisited[idx], unvisited_idxs[last] = last, idx
+        unvisited.pop()
+        if len(ntour) == problem.dimension:
             break
-        for unselected in edge_map.values():
-            if nnode in unselected:
-                unselected.remove(nnode)
 
-        # select the next node
-        candidates = edge_map.pop(nnode)
+        # remove node from the rows of its neighbours
+        candidates = [candidate for candidate in adjacency[nnode] if candidate >= 0]
+        for candidate in candidates:
+            row = adjacency[candidate]
+            row[row.index(nnode)] = -1
+            counts[candidate] -= 1
+
+        # select the next node, the candidate with the least entries
         if len(candidates) == 0:
-            nnode = random.choice(list(set(parent1) - set(ntour))) # performance improvement possible here
+            nnode = unvisited[rng.integers(len(unvisited))]
         else:
-            nnode = None
-            for candidate in candidates:
-                if not nnode or len(edge_map[candidate]) < len(edge_map[nnode]):
-                    nnode = candidate
+            nnode = min(candidates, key = counts.__getitem__)
+
+    return Solution(tour_quality(problem.distance_matrix, ntour), ntour)
+
+# key of a tour independent of its start node and direction, tours with the same key are the same cycle
+def canonical_tour_key(tour) -> bytes:
+    tour = np.roll(np.asarray(tour, dtype = np.int64), -int(np.argmin(tour)))
+    if tour[1] > tour[-1]:
+        tour[1:] = tour[:0:-1].copy()
+    return tour.tobytes()
+
+# one offspring: recombination and maybe mutation, returns the offspring and the evaluations it took
+def create_offspring(problem: Instance, parent1, parent2, mut_rate: float, rng: np.random.Generator) -> tuple:
+    newsol = edge_recombination_crossover(problem, parent1, parent2, rng)
 
-    return Solution(problem.trace_tours([ntour])[0], ntour)
+    # maybe mutation, delta evaluated, but counted as an evaluation of its own
+    if rng.random() < mut_rate:
+        return displacement_mutation(problem, newsol, rng), 2
+    return newsol, 1
 
-def ga(instance: str, cfg: dict, terminate: dict, fname_convdata: str):
+# problem of the run a worker process creates offspring for, handed over when the pool forks
+WORKER_PROBLEM: Instance = None
+
+def init_offspring_worker(problem: Instance):
+    global WORKER_PROBLEM
+    WORKER_PROBLEM = problem
+
+# create_offspring in a worker process, on the problem it inherited from the run
+def create_offspring_seeded(parent1, parent2, mut_rate: float, seed: np.random.SeedSequence) -> tuple:
+    return create_offspring(WORKER_PROBLEM, parent1, parent2, mut_rate, make_rng(seed))
+
+# rank-based selection of k slots, like random.choices with cumulative weights
+def select(order: list, cum_weights: np.ndarray, k: int, rng: np.random.Generator) -> list:
+    ranks = np.searchsorted(cum_weights, rng.random(k) * cum_weights[-1], side = 'right')
+    return [order[rank] for rank in ranks.tolist()]
+
+def ga(instance: str, cfg: dict, terminate: dict, fname_convdata: str, workers: int = 1, seed = None,
+        profile: bool = False, fname_cprofile: Path = None, recorder_options: dict = None):
     
     starttime = time.perf_counter()
-    convdata = [] if fname_convdata != None else None
-
-    # problem: tsplib95.models.StandardProblem
-    problem: tsplib95.models.StandardProblem = tsplib95.load(instance)
-    optimaltour: tsplib95.models.StandardProblem = tsplib95.load(Path(instance).with_suffix('.opt.tour').absolute())
-    optimal_quality: int = problem.trace_tours(optimaltour.tours)[0]
-
-    # initialize population with random tours
-    population = []
-    for _ in range(cfg['popsize']):
-        tour = list(problem.get_nodes())
-        random.shuffle(tour)
-        population.append(Solution(problem.trace_tours([tour])[0], tour))
-    heapq._heapify_max(population)
-    evals = len(population)
-    iters_noimprovement = 0
-
-    # initialize rank-based weights for selection
-    mean = 10 * cfg['popsize']
-    weights = np.linspace(2 * mean - mean * cfg['rank_weight'], mean * cfg['rank_weight'], cfg['popsize'])
-    cum_weights = weights.cumsum()
-
-    # iterate over generations...
-    while not ('evals' in terminate and evals >= terminate['evals'] \
-        or 'qualdev' in terminate and heapq.nsmallest(1, population)[0].qual <= optimal_quality * (1 + terminate['qualdev']) \
-        or 'time' in terminate and time.perf_counter() - starttime > terminate['time']):
-        
-        # selection...
-        parents = random.choices(population, cum_weights = cum_weights, k = 2)
-        
-        # recombination
-        newsol = edge_recombination_crossover(problem, parents[0].tour, parents[1].tour)
-        evals += 1
-
-        # maybe mutation
-        if random.random() < cfg['mut_rate']:
-            newsol = displacement_mutation(problem, newsol.tour)
-            evals += 1
-        
-        # add to population
-        worst = heapq.nlargest(1, population)[0]
-        if newsol < worst:
-            heapq._heapreplace_max(population, newsol)
-            iters_noimprovement = 0
-        else: 
-            iters_noimprovement += 1
-
-        # save state if convergence data is looked for 
-        if convdata != None:
-            best = heapq.nsmallest(1, population)[0]
-            qualdev = (best.qual - optimal_quality) / optimal_quality
-            convdata.append(Convdata(instance.name, qualdev, evals, time.perf_counter() - starttime))
+    rng = make_rng(seed)
+    profiler = make_profiler(profile, fname_cprofile)
+    profiler.start()
+    with profiler.phase('setup'):
+        # problem: compiled instance
+        problem: Instance = load_instance(instance)
+        optimal_quality: float = problem.optimal_quality
+        recorder = ConvergenceRecorder(fname_convdata, problem.name, optimal_quality, starttime, profiler = profiler, \
+            **({} if recorder_options == None else recorder_options)) \
+            if fname_convdata != None else None
+
+        # initialize population with distinct random tours, evaluated in one batch
+        tours = np.empty((cfg['popsize'], problem.dimension), dtype = np.int64)
+        slot_keys, tour_keys = [], set()
+        distinct_tours = math.factorial(problem.dimension - 1) // 2
+        for slot in range(cfg['popsize']):
+            tour = rng.permutation(problem.dimension)
+            while canonical_tour_key(tour) in tour_keys and slot < distinct_tours:
+                tour = rng.permutation(problem.dimension)
+            tours[slot] = tour
+            slot_keys.append(canonical_tour_key(tour))
+            tour_keys.add(slot_keys[-1])
+        quals = tours_qualities(problem.distance_matrix, tours)
+        evals = len(quals)
+
+        # slots ordered by quality, worst first, so order[0] is the worst and order[-1] the best solution
+        order = np.argsort(-quals, kind = 'stable').tolist()
+        ranked_quals = (-quals[order]).tolist()
+        bestqual = float(quals[order[-1]])
+
+        # initialize rank-based weights for selection
+        mean = 10 * cfg['popsize']
+        weights = np.linspace(2 * mean - mean * cfg['rank_weight'], mean * cfg['rank_weight'], cfg['popsize'])
+        cum_weights = weights.cumsum()
+
+        # steady-state with one offspring per generation, or generational with a batch of offspring,
+        # which can be created by a pool of worker processes
+        offspring = cfg.get('offspring', 1)
+
+        # steady-state generations are short, the time is only checked every 100 of them
+        termination = Termination(terminate, optimal_quality, starttime, time_stride = 100 if offspring == 1 else 1)
+
+        pool = multiprocessing.get_context('fork').Pool(workers, initializer = init_offspring_worker, initargs = (problem,)) \
+            if offspring > 1 and workers > 1 else None
+
+    # the workers are also shut down if the run fails or gets interrupted
+    try:
+        # iterate over generations...
+        while not termination.done(evals, bestqual):
+
+            if offspring > 1:
+                # selection of all parents of the generation, no more offspring than the evaluations left are expected
+                # to pay for, a mutated offspring costs two
+                remaining = termination.maxevals - evals
+                batchsize = offspring if remaining == math.inf else max(1, min(offspring, math.ceil(remaining / (1 + cfg['mut_rate']))))
+                with profiler.phase('selection'):
+                    selected = select(order, cum_weights, 2 * batchsize, rng)
+                    parents = list(zip(selected[0::2], selected[1::2]))
+
+                # recombination and mutation, every offspring gets its own random stream, so results do not depend on the workers
+                with profiler.phase('variation'):
+                    offspring_seeds = spawn_seeds(rng, batchsize)
+                    if pool != None:
+                        newsols = pool.starmap(create_offspring_seeded, [(tours[parent1], tours[parent2], cfg['mut_rate'], offspring_seed) 
+                            for (parent1, parent2), offspring_seed in zip(parents, offspring_seeds)])
+                    else:
+                        newsols = [create_offspring(problem, tours[parent1], tours[parent2], cfg['mut_rate'], make_rng(offspring_seed)) 
+                            for (parent1, parent2), offspring_seed in zip(parents, offspring_seeds)]
+
+                # offspring beyond the evaluations left are dropped, only the first offspring may overshoot them (like steady-state)
+                costs = np.cumsum([newevals for _, newevals in newsols])
+                kept = max(1, int(np.searchsorted(costs, remaining, side = 'right')))
+                newsols = newsols[:kept]
+                evals += int(costs[kept - 1])
+
+                # truncation replacement: the best distinct solutions of population and offspring survive
+                with profiler.phase('replacement'):
+                    newsols = [newsol for newsol, _ in newsols if newsol.qual < quals[order[0]]]
+                    newkeys = [canonical_tour_key(newsol.tour) for newsol in newsols]
+                    newsols = [(newsol, newkey) for newsol, newkey in zip(newsols, newkeys) if newkey not in tour_keys]
+                    newsols = list({newkey: newsol for newsol, newkey in newsols}.items())
+                    if len(newsols) > 0:
+                        allquals = np.concatenate([quals, [newsol.qual for _, newsol in newsols]])
+                        survivors = np.argsort(allquals, kind = 'stable')[:cfg['popsize']]
+                        alltours = np.concatenate([tours, [newsol.tour for _, newsol in newsols]])
+                        allkeys = slot_keys + [newkey for newkey, _ in newsols]
+                        tours, quals = alltours[survivors], allquals[survivors]
+                        slot_keys = [allkeys[survivor] for survivor in survivors.tolist()]
+                        tour_keys = set(slot_keys)
+
+                        order = np.argsort(-quals, kind = 'stable').tolist()
+                        ranked_quals = (-quals[order]).tolist()
+                        bestqual = min(bestqual, float(quals[order[-1]]))
+
+                # the population improved if any offspring survived
+                inserted = int((survivors >= cfg['popsize']).sum()) if len(newsols) > 0 else 0
+                termination.generation(inserted > 0)
+                profiler.count('insertions', inserted)
+
+            else:
+                # selection...
+                with profiler.phase('selection'):
+                    parents = select(order, cum_weights, 2, rng)
+            
+                # recombination and maybe mutation
+                with profiler.phase('variation'):
+                    newsol, newevals = create_offspring(problem, tours[parents[0]], tours[parents[1]], cfg['mut_rate'], rng)
+                evals += newevals
             
-    if convdata != None:
-        print_headers: bool = False if fname_convdata.exists() else True
-        pd.DataFrame(convdata).to_csv(fname_convdata.absolute(),  index = None, mode = 'a', header = print_headers)
+                # add to population if it is better than the worst solution and not in the population yet
+                with profiler.phase('replacement'):
+                    worst = order[0]
+                    newkey = canonical_tour_key(newsol.tour) if newsol.qual < quals[worst] else None
+                    if newkey != None and newkey not in tour_keys:
+                        tour_keys.remove(slot_keys[worst])
+                        tour_keys.add(newkey)
+                        slot_keys[worst] = newkey
+                        tours[worst], quals[worst] = newsol.tour, newsol.qual
+
+                        order.pop(0)
+                        ranked_quals.pop(0)
+                        rank = bisect.bisect_left(ranked_quals, -newsol.qual)
+                        order.insert(rank, worst)
+                        ranked_quals.insert(rank, -newsol.qual)
+
+                        bestqual = min(bestqual, newsol.qual)
+                        inserted = 1
+                    else: 
+                        inserted = 0
+                termination.generation(inserted > 0)
+                profiler.count('insertions', inserted)
+
+            profiler.count('generations')
+
+            # save state if convergence data is looked for 
+            if recorder != None:
+                recorder.record(evals, bestqual)
+
+    finally:
+        if pool != None:
+            pool.terminate()
+            pool.join()
+
+    if recorder != None:
+        recorder.close(evals, bestqual)
+    profiler.stop()
 
-    return {'qualdev': (heapq.nsmallest(1, population)[0].qual - optimal_quality) / optimal_quality, 'evals': evals, 'time': time.perf_counter() - starttime}
\ No newline at end of file
+    result = {'qualdev': (bestqual - optimal_quality) / optimal_quality, 'evals': evals, 'time': time.perf_counter() - starttime}
+    if profiler != NULL_PROFILER:
+        result['profile'] = profiler.result()
+    return result
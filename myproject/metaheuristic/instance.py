@@ -0,0 +1,96 @@
+from pathlib import Path
+from collections import namedtuple
+import hashlib
+import os
+
+import numpy as np
+
+# compiled problem instance: tours are arrays of node indices (0 .. dimension - 1), nodes[idx] is the tsplib node
+Instance = namedtuple('Instance', 'name dimension nodes coords distance_matrix optimal_tour optimal_quality')
+
+# compiled instances are cached as .npy files, one folder per instance and source file hash
+INSTANCE_CACHE_DIR = Path(__file__).resolve().parents[1] / 'data' / 'instances'
+CACHED_ARRAYS = ['nodes', 'coords', 'distance_matrix', 'optimal_tour', 'optimal_quality']
+
+# instances loaded by this process, long-lived processes (e.g. the target runner server) keep them warm
+LOADED_INSTANCES = {}
+
+def distance_matrix(problem: 'tsplib95.models.StandardProblem') -> np.ndarray:
+    nodes = list(problem.get_nodes())
+
+    # euclidean instances can be computed in one go, tsplib rounds to the nearest integer
+    if problem.edge_weight_type == 'EUC_2D' and len(problem.node_coords) > 0:
+        coords = np.array([problem.node_coords[node] for node in nodes], dtype = float)
+        deltas = coords[:, np.newaxis, :] - coords[np.newaxis, :, :]
+        return np.floor(np.sqrt((deltas**2).sum(axis = 2)) + 0.5)
+
+    # everything else goes through tsplib95 once
+    matrix = np.empty((len(nodes), len(nodes)))
+    for a, nfrom in enumerate(nodes):
+        for b, nto in enumerate(nodes):
+            matrix[a][b] = problem.get_weight(nfrom, nto)
+    return matrix
+
+def compile_instance(instance: Path) -> Instance:
+    import tsplib95 # slow to import, only needed when an instance is not cached yet
+
+    problem: tsplib95.models.StandardProblem = tsplib95.load(instance)
+    optimaltour: tsplib95.models.StandardProblem = tsplib95.load(Path(instance).with_suffix('.opt.tour').absolute())
+
+    nodes = np.array(list(problem.get_nodes()))
+    node_idxs = {node: idx for idx, node in enumerate(nodes)}
+    coords = np.array([problem.node_coords[node] for node in nodes], dtype = float) if len(problem.node_coords) > 0 \
+        else np.empty((0, 2))
+    distances = distance_matrix(problem)
+    optimal_tour = np.array([node_idxs[node] for node in optimaltour.tours[0]])
+
+    return Instance(Path(instance).name, len(nodes), nodes, coords, distances, optimal_tour,
+                    float(tour_quality(distances, optimal_tour)))
+
+def instance_hash(instance: Path) -> str:
+    sha = hashlib.sha1()
+    sha.update(Path(instance).read_bytes())
+    sha.update(Path(instance).with_suffix('.opt.tour').read_bytes())
+    return sha.hexdigest()
+
+def load_instance(instance: Path, cache_dir: Path = INSTANCE_CACHE_DIR) -> Instance:
+    if cache_dir == None:
+        return compile_instance(instance)
+
+    folder = Path(cache_dir) / (Path(instance).stem + '-' + instance_hash(instance))
+    if folder in LOADED_INSTANCES:
+        return LOADED_INSTANCES[folder]
+
+    # compile and save the instance if it is not cached yet
+    if not folder.exists():
+        compiled = compile_instance(instance)
+
+        # write into a temporary folder first, parallel target runs may compile the same instance
+        tmpfolder = folder.with_name(folder.name + '.tmp' + str(os.getpid()))
+        tmpfolder.mkdir(parents = True, exist_ok = True)
+        for name in CACHED_ARRAYS:
+            np.save(tmpfolder / (name + '.npy'), getattr(compiled, name))
+        try:
+            tmpfolder.rename(folder)
+        except OSError: # another process was faster
+            for name in CACHED_ARRAYS:
+                (tmpfolder / (name + '.npy')).unlink()
+            tmpfolder.rmdir()
+        LOADED_INSTANCES[folder] = compiled
+        return compiled
+
+    # only the distance matrix is big enough to be worth memory mapping
+    arrays = {name: np.load(folder / (name + '.npy'), mmap_mode = 'r' if name == 'distance_matrix' else None) for name in CACHED_ARRAYS}
+    LOADED_INSTANCES[folder] = Instance(Path(instance).name, len(arrays['nodes']), arrays['nodes'], arrays['coords'], 
+                                        arrays['distance_matrix'], arrays['optimal_tour'], float(arrays['optimal_quality']))
+    return LOADED_INSTANCES[folder]
+
+# evaluates a single tour given as sequence of node indices
+def tour_quality(distance_matrix: np.ndarray, tour) -> float:
+    tour = np.asarray(tour)
+    return distance_matrix[tour, np.roll(tour, -1)].sum()
+
+# evaluates a batch of tours given as (tours x dimension) array of node indices
+def tours_qualities(distance_matrix: np.ndarray, tours) -> np.ndarray:
+    tours = np.asarray(tours)
+    return distance_matrix[tours, np.roll(tours, -1, axis = 1)].sum(axis = 1)
@@ -0,0 +1,80 @@
+from contextlib import nullcontext
+from pathlib import Path
+import cProfile
+import time
+
+# wall clock time of one phase, reused for every entry into the phase. nested phases are timed inclusively
+class Phase:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.time = 0.0
+        self.calls = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.time += time.perf_counter() - self.start
+        self.calls += 1
+        return False
+
+# times the phases of a run (construction, evaluation, selection, io...) and counts events,
+# optionally also runs cProfile over the whole run and dumps its stats into fname_cprofile
+class PhaseProfiler:
+
+    def __init__(self, fname_cprofile: Path = None):
+        self.phases = {}
+        self.counters = {}
+        self.fname_cprofile = fname_cprofile
+        self.cprofile = cProfile.Profile() if fname_cprofile != None else None
+
+    def phase(self, name: str) -> Phase:
+        phase = self.phases.get(name)
+        if phase == None:
+            phase = self.phases[name] = Phase(name)
+        return phase
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def start(self):
+        if self.cprofile != None:
+            self.cprofile.enable()
+
+    def stop(self):
+        if self.cprofile != None:
+            self.cprofile.disable()
+            Path(self.fname_cprofile).parent.mkdir(parents = True, exist_ok = True)
+            self.cprofile.dump_stats(str(self.fname_cprofile))
+
+    # profile entry of the run result
+    def result(self) -> dict:
+        return {'phases': {name: {'time': phase.time, 'calls': phase.calls} for name, phase in self.phases.items()},
+                'counters': dict(self.counters)}
+
+# stands in for the profiler when profiling is off, its phases do not read the clock
+class NullProfiler:
+
+    phase_context = nullcontext()
+
+    def phase(self, name: str) -> nullcontext:
+        return self.phase_context
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+# a cProfile dump implies profiling
+def make_profiler(profile: bool = False, fname_cprofile: Path = None):
+    if not profile and fname_cprofile == None:
+        return NULL_PROFILER
+    return PhaseProfiler(fname_cprofile)
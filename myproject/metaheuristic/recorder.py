@@ -0,0 +1,102 @@
+from pathlib import Path
+import math
+import time
+
+import numpy as np
+
+from myproject.convstore import write_run
+from myproject.metaheuristic.profiler import NULL_PROFILER
+
+CONVDATA_COLUMNS = ['instance', 'qualdev', 'evals', 'time']
+
+EVAL_GRIDS = ['log', 'linear']
+
+# the first eval count after evals at which the state gets recorded regardless of improvements,
+# computed on the fly, so the grid has no upper bound and takes no memory
+def next_grid_evals(grid: str, resolution: int, evals: int) -> int:
+    if grid == 'log': # resolution points per decade, powers of ten are always included
+        exponent = max(0, int(math.log10(evals) * resolution) - 1) if evals > 0 else 0
+        while round(10**(exponent / resolution)) <= evals:
+            exponent += 1
+        return round(10**(exponent / resolution))
+    if grid == 'linear': # every resolution evals
+        return (evals // resolution + 1) * resolution
+    raise ValueError('No evaluation grid: "' + grid + '"')
+
+# records the best quality deviation of a run whenever it improves and at the eval counts of a grid,
+# buffers them in preallocated arrays and appends them to a csv file in chunks. 
+# if fname is not a csv file, it is a partition folder of the columnar convergence storage (see convstore).
+# writing is timed as the io phase of the profiler
+# grid, resolution and chunksize are the recorder_options of the metaheuristics and of mhrun
+class ConvergenceRecorder:
+
+    def __init__(self, fname: Path, instance: str, optimal_quality: float, starttime: float = None,
+                    grid: str = 'log', resolution: int = 100, chunksize: int = 4096, profiler = NULL_PROFILER):
+        self.fname = Path(fname)
+        self.columnar = self.fname.suffix != '.csv'
+        self.chunks = []
+        self.instance = instance
+        self.optimal_quality = optimal_quality
+        self.starttime = time.perf_counter() if starttime == None else starttime
+        self.profiler = profiler
+
+        if grid not in EVAL_GRIDS:
+            raise ValueError('No evaluation grid: "' + grid + '"')
+        self.grid = grid
+        self.resolution = resolution
+        self.next_evals = next_grid_evals(grid, resolution, 0)
+        self.bestqual = math.inf
+        self.last_evals = None
+
+        self.qualdevs = np.empty(chunksize, dtype = float)
+        self.evals = np.empty(chunksize, dtype = np.int64)
+        self.times = np.empty(chunksize, dtype = float)
+        self.count = 0
+
+    def record(self, evals: int, bestqual: float, force: bool = False):
+        if bestqual >= self.bestqual and evals < self.next_evals and not force:
+            return
+
+        # move on to the next grid point that has not been passed yet
+        if evals >= self.next_evals:
+            self.next_evals = next_grid_evals(self.grid, self.resolution, evals)
+
+        self.bestqual = bestqual
+        self.last_evals = evals
+        self.qualdevs[self.count] = (bestqual - self.optimal_quality) / self.optimal_quality
+        self.evals[self.count] = evals
+        self.times[self.count] = time.perf_counter() - self.starttime
+        self.count += 1
+
+        if self.count == len(self.evals):
+            self.flush()
+
+    # records the final state of the run and writes everything out
+    def close(self, evals: int, bestqual: float):
+        if evals != self.last_evals:
+            self.record(evals, bestqual, force = True)
+        self.flush()
+
+        if self.columnar:
+            with self.profiler.phase('io'):
+                qualdevs, evals, times = (np.concatenate(column) for column in zip(*self.chunks))
+                write_run(self.fname, self.instance, qualdevs, evals, times)
+
+    def flush(self):
+        if self.count == 0:
+            return
+
+        if self.columnar:
+            self.chunks.append((self.qualdevs[:self.count].copy(), self.evals[:self.count].copy(), self.times[:self.count].copy()))
+            self.count = 0
+            return
+
+        with self.profiler.phase('io'):
+            lines = ['{},{!r},{},{!r}\n'.format(self.instance, qualdev, evals, time) for qualdev, evals, time
+                        in zip(self.qualdevs[:self.count].tolist(), self.evals[:self.count].tolist(), self.times[:self.count].tolist())]
+            header = not self.fname.exists()
+            with self.fname.open('a') as fconv:
+                if header:
+                    fconv.write(','.join(CONVDATA_COLUMNS) + '\n')
+                fconv.writelines(lines)
+        self.count = 0
@@ -2,23 +2,24 @@ import logging
 
 from pathlib import Path
 import math
-import random
 import time
 import numpy as np
-import pandas as pd
 
-import tsplib95
-
-from myproject.metaheuristic.commons import Convdata, n2opt
+from myproject.metaheuristic.commons import Tour, n2opt_delta, make_rng, spawn_seeds
+from myproject.metaheuristic.instance import Instance, load_instance, tour_quality, tours_qualities
+from myproject.metaheuristic.profiler import NULL_PROFILER, make_profiler
+from myproject.metaheuristic.recorder import ConvergenceRecorder
+from myproject.metaheuristic.termination import Termination
 
 # logging.basicConfig(level=logging.DEBUG) # logging
 
-def accept(current_quality: float, neighbor_quality: float, current_temperature: float) -> bool:
+# draw is a uniform random number in [0, 1)
+def accept(current_quality: float, neighbor_quality: float, current_temperature: float, draw: float) -> bool:
     if neighbor_quality <= current_quality:
         return True
             
     probability = math.e**((current_quality - neighbor_quality)/current_temperature)
-    if random.random() < probability:
+    if draw < probability:
         return True
 
     return False
@@ -26,68 +27,186 @@ def accept(current_quality: float, neighbor_quality: float, current_temperature:
 def sa( instance: str, 
         cfg: dict, 
         terminate: dict,
-        fname_convdata: Path = None) -> dict:
+        fname_convdata: Path = None,
+        seed = None,
+        profile: bool = False,
+        fname_cprofile: Path = None,
+        recorder_options: dict = None) -> dict:
     starttime = time.perf_counter()
+    rng = make_rng(seed)
+    profiler = make_profiler(profile, fname_cprofile)
+    profiler.start()
+    with profiler.phase('setup'):
+        # problem: compiled instance
+        problem: Instance = load_instance(instance)
+        optimal_quality: float = problem.optimal_quality
+        recorder = ConvergenceRecorder(fname_convdata, problem.name, optimal_quality, starttime, profiler = profiler, \
+            **({} if recorder_options == None else recorder_options)) \
+            if fname_convdata != None else None
+        termination = Termination(terminate, optimal_quality, starttime)
+
+        # setup
+        curtour = Tour(rng.permutation(problem.dimension))
+        curqual = float(tour_quality(problem.distance_matrix, curtour.nodes))
+        distances = problem.distance_matrix.tolist() # nested lists are faster to index from python
+        evals = 1
+
+        posmoves = [(a, b) for a in range(len(curtour)) for b in range(a, len(curtour)) if abs(a-b) > 1 and not (a == 0 and b == len(curtour) - 1)]
+        move_pointer = 1000
 
-    convdata = [] if fname_convdata != None else None
+    temperature = cfg['initial_temperature']
+    bestqual = curqual
+
+    while not termination.done(evals, bestqual):
+        
+        count_accepted = 0
+        improved = False
+        # evaluation and acceptance of the moves of one temperature, including the block draws
+        with profiler.phase('search'):
+            for _ in range(cfg['repetitions']):
+
+                # moves and acceptance draws in blocks, single draws from the generator are slow
+                if move_pointer == 1000:
+                    with profiler.phase('draw'):
+                        rand_order_posmoves = [posmoves[idx] for idx in rng.integers(len(posmoves), size = 1000).tolist()]
+                        draws = rng.random(1000).tolist()
+                    move_pointer = 0
+
+                # get neighbor quality, the move is only applied to the tour when it is accepted
+                move = rand_order_posmoves[move_pointer]
+                neighqual = curqual + n2opt_delta(distances, curtour.nodes, move[0], move[1])
+                draw = draws[move_pointer]
+                move_pointer += 1
+                evals += 1
+
+                # accept neighbor if 
+                if accept(curqual, neighqual, temperature, draw):
+                    curtour.n2opt(move[0], move[1])
+                    curqual = neighqual
+                    count_accepted += 1
+
+                    if curqual < bestqual:
+                        bestqual = curqual
+                        improved = True
+            
+                if recorder != None:
+                    recorder.record(evals, bestqual)
+
+        # stagnation, then cool down
+        termination.temperature(improved, count_accepted / cfg['repetitions'])
+        temperature *= cfg['cooling_factor']
+        temperature = max(temperature, 0.00001) # avoid rounding errors
+        profiler.count('temperatures')
+        profiler.count('accepted', count_accepted)
+    if recorder != None:
+        recorder.close(evals, bestqual)
+    profiler.stop()
+
+    result = {'qualdev': (bestqual - optimal_quality) / optimal_quality, 'evals': evals, 'time': time.perf_counter() - starttime}
+    if profiler != NULL_PROFILER:
+        result['profile'] = profiler.result()
+    return result
+
+# runs independent sa chains in lockstep, every step draws one move for each chain and accepts them vectorized.
+# all chains share the temperature schedule, a chain stops when its termination condition is met at the start of
+# a temperature, like in sa(). returns one result per chain
+def sa_chains(instance: str, 
+                cfg: dict, 
+                terminate: dict,
+                chains: int,
+                fname_convdata: Path = None,
+                seed = None,
+                blocksize: int = 1000,
+                recorder_options: dict = None) -> list:
+    starttime = time.perf_counter()
+    rngs = [make_rng(chain_seed) for chain_seed in spawn_seeds(seed, chains)] # one independent stream per chain
 
-    # problem: tsplib95.models.StandardProblem
-    problem: tsplib95.models.StandardProblem = tsplib95.load(instance)
-    optimaltour: tsplib95.models.StandardProblem = tsplib95.load(Path(instance).with_suffix('.opt.tour').absolute())
-    optimal_quality: int = problem.trace_tours(optimaltour.tours)[0]
+    # problem: compiled instance
+    problem: Instance = load_instance(instance)
+    optimal_quality: float = problem.optimal_quality
+    recorders = [ConvergenceRecorder(fname_convdata, problem.name, optimal_quality, starttime,
+                    **({} if recorder_options == None else recorder_options)) for _ in range(chains)] \
+        if fname_convdata != None else None
+    termination = Termination(terminate, optimal_quality, starttime) # its bounds, stagnation is counted per chain
 
     # setup
-    curtour = list(problem.get_nodes())
-    random.shuffle(curtour)
-    curqual = problem.trace_tours([curtour])[0]
-    evals = 1
+    distances = np.asarray(problem.distance_matrix)
+    tours = np.array([rng.permutation(problem.dimension) for rng in rngs])
+    curquals = tours_qualities(distances, tours)
+    bestquals = curquals.copy()
+    evals = 1 # the same for all active chains
 
-    posmoves = [(a, b) for a in range(len(curtour)) for b in range(a, len(curtour)) if abs(a-b) > 1 and not (a == 0 and b == len(curtour) - 1)]
-    rand_order_posmoves = random.choices(posmoves, k = 1000)
-    move_pointer = 0
+    dim = problem.dimension
+    posmoves = np.array([(a, b) for a in range(dim) for b in range(a, dim) if abs(a-b) > 1 and not (a == 0 and b == dim - 1)])
+    rows, idxs = np.arange(chains), np.arange(dim)
+    move_pointer = blocksize
 
     temperature = cfg['initial_temperature']
-    bestqual = curqual
-    count_accepted = 0
-    count_temperatures_wo_improvement = 0
-
-    while not ('evals' in terminate and evals >= terminate['evals'] \
-                or 'qualdev' in terminate and bestqual <= optimal_quality * (1 + terminate['qualdev']) \
-                or 'time' in terminate and time.perf_counter() - starttime > terminate['time']):
-        
-        count_temperatures_wo_improvement += 1
+    active = np.ones(chains, dtype = bool)
+    stagnant = np.zeros(chains, dtype = np.int64)
+    results = [None] * chains
+
+    while active.any():
+
+        # stop chains that reached their termination condition
+        elapsed = time.perf_counter() - starttime
+        stop = active & ((evals >= termination.maxevals) | (bestquals <= termination.minqual) | termination.timed_out() \
+                    | (stagnant >= termination.max_temperatures))
+        for chain in rows[stop]:
+            results[chain] = {'qualdev': float(bestquals[chain] - optimal_quality) / optimal_quality, 'evals': evals, 'time': elapsed}
+            if recorders != None:
+                recorders[chain].close(evals, bestquals[chain])
+        active &= ~stop
+        if not active.any():
+            break
+
+        count_accepted = np.zeros(chains, dtype = np.int64)
+        temperature_improved = np.zeros(chains, dtype = bool)
         for _ in range(cfg['repetitions']):
 
-            if move_pointer == len(rand_order_posmoves):
-                rand_order_posmoves = random.choices(posmoves, k = 1000)
+            if move_pointer == blocksize:
+                moves = posmoves[np.stack([rng.integers(len(posmoves), size = blocksize) for rng in rngs], axis = 1)]
+                randoms = np.stack([rng.random(blocksize) for rng in rngs], axis = 1)
                 move_pointer = 0
 
-            # get neighbor
-            move = rand_order_posmoves[move_pointer]
-            neighsol = n2opt(curtour, move[0], move[1])
-            move_pointer += 1
-            neighqual = problem.trace_tours([neighsol])[0]
+            # neighbor qualities of all chains, moves are only applied to the tours when they are accepted
+            idx1, idx3 = moves[move_pointer, :, 0], moves[move_pointer, :, 1]
+            a, b = tours[rows, idx1], tours[rows, idx1 + 1]
+            c, d = tours[rows, idx3], tours[rows, (idx3 + 1) % dim]
+            deltas = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
             evals += 1
 
-            # accept neighbor if 
-            if accept(curqual, neighqual, temperature):
-                curtour = neighsol
-                curqual = neighqual
-                count_accepted += 1
-
-                if curqual < bestqual:
-                    bestqual = curqual
-                    count_temperatures_wo_improvement = 0    
-            
-            if convdata != None:
-                qualdev = (bestqual - optimal_quality) / optimal_quality
-                convdata.append(Convdata(instance.name, qualdev, evals, time.perf_counter() - starttime))
-
-        # cool down
+            # metropolis acceptance
+            accepted = active & ((deltas <= 0) | (randoms[move_pointer] < np.exp(np.minimum(-deltas / temperature, 0))))
+            move_pointer += 1
+            if not accepted.any():
+                continue
+
+            # reverse the segments idx1 + 1 .. idx3 of the accepted chains
+            chainidxs = rows[accepted]
+            segment = (idxs > idx1[chainidxs, np.newaxis]) & (idxs <= idx3[chainidxs, np.newaxis])
+            sources = np.where(segment, (idx1 + idx3 + 1)[chainidxs, np.newaxis] - idxs, idxs)
+            tours[chainidxs] = np.take_along_axis(tours[chainidxs], sources, axis = 1)
+            curquals[chainidxs] += deltas[chainidxs]
+            count_accepted[chainidxs] += 1
+
+            improved = chainidxs[curquals[chainidxs] < bestquals[chainidxs]]
+            bestquals[improved] = curquals[improved]
+            temperature_improved[improved] = True
+
+            if recorders != None:
+                for chain in improved:
+                    recorders[chain].record(evals, bestquals[chain])
+
+        # grid points are recorded once per temperature
+        if recorders != None:
+            for chain in rows[active]:
+                recorders[chain].record(evals, bestquals[chain])
+
+        # stagnation, then cool down
+        stagnant[temperature_improved] = 0
+        stagnant[~temperature_improved & (count_accepted / cfg['repetitions'] < termination.accportion)] += 1
         temperature *= cfg['cooling_factor']
         temperature = max(temperature, 0.00001) # avoid rounding errors
-    if convdata != None:
-        print_headers: bool = False if fname_convdata.exists() else True
-        pd.DataFrame(convdata).to_csv(fname_convdata.absolute(),  index = None, mode = 'a', header = print_headers)
 
-    return {'qualdev': (bestqual - optimal_quality) / optimal_quality, 'evals': evals, 'time': time.perf_counter() - starttime}
+    return results
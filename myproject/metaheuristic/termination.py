@@ -0,0 +1,56 @@
+import math
+import time
+
+# termination policy of a run, built from a termination condition dict:
+#   evals: maximum number of evaluations
+#   qualdev: stop once the quality deviation from the optimum is at most this value
+#   time: maximum run time in seconds, checked every time_stride calls of done()
+#   noimprovement: stagnation, {'temperatures': t, 'accportion': p} stops sa after t temperatures in a row without
+#       improvement that accepted less than the portion p of their moves, {'generations': g} stops aco and ga after
+#       g generations (iterations) in a row without improvement
+class Termination:
+
+    def __init__(self, terminate: dict, optimal_quality: float, starttime: float = None, time_stride: int = 1):
+        self.maxevals = terminate.get('evals', math.inf)
+        self.minqual = optimal_quality * (1 + terminate['qualdev']) if 'qualdev' in terminate else -math.inf
+        self.maxtime = terminate.get('time', math.inf)
+        self.starttime = time.perf_counter() if starttime == None else starttime
+        self.time_stride = time_stride
+        self.time_countdown = time_stride
+
+        noimprovement = terminate.get('noimprovement', {})
+        self.max_temperatures = noimprovement.get('temperatures', math.inf)
+        self.accportion = noimprovement.get('accportion', math.inf)
+        self.max_generations = noimprovement.get('generations', math.inf)
+        self.stagnant = 0
+
+        self.stopped = False
+
+    def done(self, evals: int, bestqual: float) -> bool:
+        if self.stopped or evals >= self.maxevals or bestqual <= self.minqual:
+            return True
+        return self.timed_out()
+
+    def timed_out(self) -> bool:
+        if self.maxtime == math.inf:
+            return False
+
+        self.time_countdown -= 1
+        if self.time_countdown > 0:
+            return self.stopped
+        self.time_countdown = self.time_stride
+        self.stopped = self.stopped or time.perf_counter() - self.starttime > self.maxtime
+        return self.stopped
+
+    # called at the end of every sa temperature
+    def temperature(self, improved: bool, accepted_portion: float):
+        if improved:
+            self.stagnant = 0
+        elif accepted_portion < self.accportion:
+            self.stagnant += 1
+        self.stopped = self.stopped or self.stagnant >= self.max_temperatures
+
+    # called at the end of every aco iteration or ga generation
+    def generation(self, improved: bool):
+        self.stagnant = 0 if improved else self.stagnant + 1
+        self.stopped = self.stopped or self.stagnant >= self.max_generations
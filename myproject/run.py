@@ -1,11 +1,13 @@
 # pylint: disable=no-member
 import datetime
+import os
 import sys
 from pathlib import Path
 import random
 import itertools
+import multiprocessing
 
-import pandas as pd
+import numpy as np
 
 from myproject.metaheuristic.sa import sa
 from myproject.metaheuristic.aco import aco
@@ -13,8 +15,10 @@ from myproject.metaheuristic.ga import ga
 import myproject.tuning_wrapper as tuning_wrapper
 
 from myproject.helpers import BASE_TERM, DEF_CFG_SA_50N, DEF_CFG_GA, DEF_CFG_ACO_50N, DEF_CFGS
-from myproject.helpers import cmhrun_fname, ctun_fname
+from myproject.helpers import ctun_fname
 from myproject.helpers import incumbents_smac, config_to_cand_params_smac, from_cand_params
+from myproject.convstore import create_partition
+from myproject.catalog import has_runs, insert_runs
 
 from collections import namedtuple
 
@@ -24,54 +28,72 @@ def mhrun(instance: Path,
             algorithm: str,
             terminate: dict = None, 
             config: dict = None, 
-            fname_convdata = None):
+            fname_convdata = None,
+            seed = None,
+            profile: bool = False,
+            fname_cprofile: Path = None,
+            recorder_options: dict = None):
 
     if algorithm == 'SA':
         # use default configuration and termination values if none are given
         cfg = DEF_CFG_SA_50N if config == None else config
         terminate = BASE_TERM if terminate == None else terminate
-        return sa(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata)
+        return sa(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata, seed = seed,
+                    profile = profile, fname_cprofile = fname_cprofile, recorder_options = recorder_options)
 
     if algorithm == 'ACO':
         # use default configuration and termination values if none are given
         cfg = DEF_CFG_ACO_50N if config == None else config
         terminate = BASE_TERM if terminate == None else terminate
-        return aco(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata)
+        return aco(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata, seed = seed,
+                    profile = profile, fname_cprofile = fname_cprofile, recorder_options = recorder_options)
 
     if algorithm == 'GA':
         # use default configuration and termination values if none are given
         cfg = DEF_CFG_GA if config == None else config
         terminate = BASE_TERM if terminate == None else terminate
-        return ga(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata)
+        return ga(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata, seed = seed,
+                    profile = profile, fname_cprofile = fname_cprofile, recorder_options = recorder_options)
 
     else: 
         print('Error: Algorithm ' + '"' + algorithm + '" not found!')
     
+# seed of the run on one instance, only depends on the seed of all runs and the instance name
+def instance_seed(seed: int, instance: Path) -> int:
+    return random.Random(str(seed) + Path(instance).name).randint(1, 2**31 - 1)
+
+# mhrun with positional arguments in the order of the mhruns jobs
+def mhrun_seeded(instance: Path, algorithm: str, terminate: dict, config: dict, seed: int, fname_convdata: Path,
+                    recorder_options: dict = None) -> dict:
+    return mhrun(instance, algorithm = algorithm, terminate = terminate, config = config, fname_convdata = fname_convdata, seed = seed,
+                    recorder_options = recorder_options)
+
 def mhruns(budget_tuned: int, 
                 instancefolder: str, 
                 algorithm: str,
                 terminate: dict = None, 
-                config: dict = None):
+                config: dict = None,
+                workers: int = 1,
+                seed: int = None,
+                recorder_options: dict = None):
     
-    seed = random.randint(1, 10000)
-    random.seed(seed)
-    results = []
-    entries = Path(instancefolder)
-    mhrun_fname = cmhrun_fname(algorithm, config, terminate)
-
-    for entry in entries.iterdir():
+    # without a seed, the runs are still reproducible from the drawn one
+    seed = np.random.SeedSequence().entropy if seed == None else seed
+    entries = sorted(entry for entry in Path(instancefolder).iterdir() if entry.suffix == '.tsp')
+    # every run saves its convergence data into its own file of the partition
+    fconvdata = create_partition(algorithm, config, terminate)
+    jobs = [(entry, algorithm, terminate, config, instance_seed(seed, entry), fconvdata, recorder_options) for entry in entries]
 
-        if entry.suffix != '.tsp':
-                continue
-        
-        result = mhrun(entry, algorithm = algorithm, terminate = terminate, config = config, \
-                        fname_convdata = Path('myproject/data/conv/' + mhrun_fname + '.csv'))
-        results.append(Result(budget_tuned, entry.name, result['qualdev'], result['evals'], result['time']))
+    if workers > 1:
+        # fork, so the workers do not re-execute the scripts in this module
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            mhresults = pool.starmap(mhrun_seeded, jobs)
+    else:
+        mhresults = list(itertools.starmap(mhrun_seeded, jobs))
 
-    fpath = Path('myproject/data/results/' + mhrun_fname + '.csv')
-    df: pd.DataFrame = pd.DataFrame(results)
-    mode = 'a' if fpath.exists() else 'w+'
-    df.to_csv(fpath.absolute(), mode = mode, index = False)
+    results = [dict(Result(budget_tuned, entry.name, result['qualdev'], result['evals'], result['time'])._asdict(), seed = job[4])
+                for entry, job, result in zip(entries, jobs, mhresults)]
+    insert_runs(algorithm, config, terminate, results)
 
 
 ### Run tuners Tune evals ###
@@ -105,11 +127,9 @@ for metaheuristic in metaheuristics:
             for configuration in incumbents['Configuration']:
                 cand_params = config_to_cand_params_smac(configuration)
                 algorithm, config, term, opt = from_cand_params(cand_params)
-                mhrun_fname = cmhrun_fname(algorithm, config, terminate)
                 print('Metaheuristic run with ' + str((algorithm, tuning_budget, config, terminate)))
-                if not Path('myproject/data/results/' + mhrun_fname + '.csv').exists():
-                    print(Path('myproject/data/results/' + mhrun_fname).absolute())
-                    mhruns(tuning_budget, 'myproject/instances/50nodes/test', algorithm, terminate, config)
+                if not has_runs(algorithm, config, terminate):
+                    mhruns(tuning_budget, 'myproject/instances/50nodes/test', algorithm, terminate, config, workers = os.cpu_count())
 
             # create convergence files for last incumbent with base termination condition
 
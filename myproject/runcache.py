@@ -0,0 +1,95 @@
+###############################################################################
+# Content-addressed cache of metaheuristic run results. The key of a run is a
+# hash of the algorithm, the normalized configuration and termination
+# condition, the content of the instance file and the seed, so tuners that
+# request the same run again get the stored result without running it.
+#
+# Every entry is one small json file, myproject/data/runcache/<key[:2]>/<key>.json.
+# Entries expire after RUN_CACHE_MAX_AGE seconds without being used, evict()
+# also removes the least recently used entries above RUN_CACHE_MAX_BYTES.
+# The environment variable RUN_CACHE_DIR moves the cache, setting it to an
+# empty string disables it.
+###############################################################################
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import time
+
+from myproject.catalog import normalize_params
+from myproject.metaheuristic.instance import instance_hash
+
+RUN_CACHE_DIR = os.environ.get('RUN_CACHE_DIR', str(Path(__file__).resolve().parent / 'data' / 'runcache'))
+RUN_CACHE_DIR = Path(RUN_CACHE_DIR) if RUN_CACHE_DIR != '' else None
+RUN_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+RUN_CACHE_MAX_BYTES = 256 * 1024**2
+
+def run_key(algorithm: str, config: dict, terminate: dict, instance: Path, seed: int) -> str:
+    key = '\n'.join([algorithm, normalize_params(config), normalize_params(terminate), instance_hash(instance), str(seed)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def entry_path(key: str, cache_dir: Path = RUN_CACHE_DIR) -> Path:
+    return Path(cache_dir) / key[:2] / (key + '.json')
+
+def lookup(key: str, cache_dir: Path = RUN_CACHE_DIR, max_age: float = RUN_CACHE_MAX_AGE) -> dict:
+    fentry = entry_path(key, cache_dir)
+    try:
+        if time.time() - fentry.stat().st_mtime > max_age:
+            return None
+        result = json.loads(fentry.read_text())
+    except (OSError, ValueError): # missing, or half written by a crashed process
+        return None
+
+    os.utime(fentry) # mark as recently used for the eviction
+    return result
+
+def store(key: str, result: dict, cache_dir: Path = RUN_CACHE_DIR):
+    fentry = entry_path(key, cache_dir)
+    fentry.parent.mkdir(parents = True, exist_ok = True)
+
+    # write into a temporary file first, parallel target runs may store the same key
+    tmpfentry = fentry.with_name(fentry.name + '.tmp' + str(os.getpid()))
+    tmpfentry.write_text(json.dumps(result))
+    os.replace(tmpfentry, fentry)
+
+# returns the cached result of the run or runs it. unseeded runs and runs with a time limit are not determined
+# by their seed and never cached. runs that record convergence data must not go through it, a cached result
+# would not write their convergence data
+def cached_run(run, algorithm: str, instance: Path, config: dict, terminate: dict, seed: int = None,
+                cache_dir: Path = RUN_CACHE_DIR) -> dict:
+    if cache_dir == None or seed == None or 'time' in terminate:
+        return run()
+
+    key = run_key(algorithm, config, terminate, instance, seed)
+    result = lookup(key, cache_dir)
+    if result == None:
+        result = run()
+        store(key, result, cache_dir)
+    return result
+
+# removes expired entries and then the least recently used ones until the cache fits into max_bytes,
+# returns the number of removed entries
+def evict(cache_dir: Path = RUN_CACHE_DIR, max_bytes: int = RUN_CACHE_MAX_BYTES, max_age: float = RUN_CACHE_MAX_AGE) -> int:
+    if cache_dir == None or not Path(cache_dir).exists():
+        return 0
+
+    now = time.time()
+    entries = []
+    for fentry in Path(cache_dir).glob('*/*.json'):
+        try:
+            stat = fentry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, fentry))
+    entries.sort()
+
+    removed = 0
+    size = sum(entry[1] for entry in entries)
+    for mtime, entry_size, fentry in entries:
+        if now - mtime <= max_age and size <= max_bytes:
+            break
+        fentry.unlink(missing_ok = True)
+        size -= entry_size
+        removed += 1
+    return removed
@@ -0,0 +1,84 @@
+#!/home/damian/anaconda3/envs/ma-code/bin/python
+
+###############################################################################
+# This script is the command that is executed every run by smac and irace.
+# Its imports are kept to a minimum, since the interpreter is started anew for
+# every run: the metaheuristic is imported only once it is known, and pandas,
+# rpy2 and tsplib95 are only imported by the code paths that need them.
+#
+# PARAMETERS (irace):
+# argv[1] is the candidate configuration number
+# argv[2] is the instance ID
+# argv[3] is the seed
+# argv[4] is the instance name
+# The rest (argv[5:]) are parameters to the run
+#
+# PARAMETERS (smac):
+# argv[1] is the instance name, argv[2:6] are the instance specifics, cutoff
+# time, cutoff length and seed, the rest (argv[6:]) are parameters to the run
+#
+# RETURN VALUE:
+# This script prints one numerical value (irace) or the smac result line.
+# Exit with 0 if no error, with 1 in case of error
+###############################################################################
+
+import sys
+from pathlib import Path
+
+from myproject.helpers import params2dict, separate_cfg_term_opt
+from myproject.runcache import cached_run
+
+def run_algorithm(algorithm: str, instance: str, cfg: dict, terminate: dict, fname_convdata: Path = None, seed = None) -> dict:
+    if algorithm == 'SA':
+        from myproject.metaheuristic.sa import sa
+        return sa(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata, seed = seed)
+    elif algorithm == 'ACO':
+        from myproject.metaheuristic.aco import aco
+        return aco(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata, seed = seed)
+    elif algorithm == 'GA':
+        from myproject.metaheuristic.ga import ga
+        return ga(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = fname_convdata, seed = seed)
+
+# performs one target run for the given tuner command line arguments (without the script name), returns the output line
+def target_run(argv: list) -> str:
+
+    # Get the parameters as command line arguments.
+    tuner = None
+    instance = None 
+    seed = None
+    lparams = None
+
+    # case differentiation between smac and irace
+    if (Path(argv[3]).exists()):
+        # called by irace 
+        tuner = 'irace'
+        instance = argv[3]
+        seed = int(argv[2])
+        lparams = argv[4:]
+    elif (Path(argv[0]).exists()):
+        # called by smac
+        tuner = 'SMAC'
+        instance = argv[0]
+        seed = int(argv[4])
+        lparams = argv[5:]
+
+    # Tuned parameters
+    dparams = params2dict(lparams)
+    algorithm = dparams.pop('algorithm')
+    cfg, terminate, optimize = separate_cfg_term_opt(dparams)
+                  
+    # Run runner with the seed of the tuner, tuners re-request runs (e.g. of incumbents), those come from the run cache
+    result = cached_run(lambda: run_algorithm(algorithm, instance, cfg, terminate, seed = seed), algorithm, instance, cfg, terminate, seed)
+
+    if tuner == 'irace':
+        return str(result[optimize])
+    elif tuner == 'SMAC':
+        return 'Result of this algorithm run: %s, %f, %i, %f, %i, %s' % ('SUCCESS', result['time'], result['evals'], result[optimize], 1, 0)
+
+if __name__=='__main__':
+    if len(sys.argv) < 5:
+        print("\nUsage: ./target_runner.py <configuration_id> <instance_id> <seed> <instance_path_name> <list of parameters>\n")
+        sys.exit(1)
+
+    print(target_run(sys.argv[1:]))
+    sys.exit(0)
@@ -0,0 +1,36 @@
+#!/home/damian/anaconda3/envs/ma-code/bin/python
+
+###############################################################################
+# Thin target runner for smac and irace. It takes the same arguments and prints
+# the same output as target_runner.py, but hands the run to a running target
+# runner server (see target_runner_server.py) which keeps the modules and
+# instances loaded. Without a reachable server the run is done in-process.
+###############################################################################
+
+import json
+import os
+import socket
+import sys
+
+SOCKET_PATH = os.environ.get('TARGET_RUNNER_SOCKET', '/tmp/mhtuning-target-runner.sock')
+
+def request(argv: list, socket_path: str = SOCKET_PATH) -> tuple:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps({'argv': argv, 'cwd': os.getcwd()}) + '\n').encode())
+        reply = json.loads(sock.makefile('r').readline())
+    return reply['output'], reply['status']
+
+if __name__=='__main__':
+    if len(sys.argv) < 5:
+        print("\nUsage: ./target_runner_client.py <configuration_id> <instance_id> <seed> <instance_path_name> <list of parameters>\n")
+        sys.exit(1)
+
+    try:
+        output, status = request(sys.argv[1:])
+    except (FileNotFoundError, ConnectionRefusedError): # no server running
+        from myproject.target_runner import target_run
+        output, status = target_run(sys.argv[1:]), 0
+
+    print(output)
+    sys.exit(status)
@@ -0,0 +1,61 @@
+###############################################################################
+# Long-lived target runner server. smac and irace call target_runner_client.py,
+# which sends the command line arguments over a unix socket. Every run is
+# executed in a forked child, so modules and instances loaded in the server
+# process stay warm and runs do not share state.
+#
+# Usage: python3 -m myproject.target_runner_server [<instance folder> ...]
+# Instances in the given folders are loaded before serving.
+###############################################################################
+
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import traceback
+from pathlib import Path
+
+from myproject.target_runner import target_run
+from myproject.metaheuristic.instance import load_instance
+from myproject.target_runner_client import SOCKET_PATH
+
+class TargetRunHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+
+        # what the run prints (e.g. the error message of unknown parameters) goes back to the client,
+        # like the output of target_runner.py run directly
+        printed = io.StringIO()
+        try:
+            os.chdir(request['cwd'])
+            with contextlib.redirect_stdout(printed):
+                output = target_run(request['argv'])
+            output, status = printed.getvalue() + output, 0
+        except SystemExit as exit: # e.g. unknown parameters
+            output, status = printed.getvalue().rstrip('\n'), exit.code
+        except Exception:
+            output, status = printed.getvalue() + traceback.format_exc(), 1
+
+        self.wfile.write((json.dumps({'output': output, 'status': status}) + '\n').encode())
+
+class TargetRunServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+def serve(socket_path: str = SOCKET_PATH, instance_folders: list = []):
+
+    # load instances once, the forked children get them for free
+    for folder in instance_folders:
+        for entry in Path(folder).rglob('*.tsp'):
+            load_instance(entry)
+
+    if Path(socket_path).exists():
+        Path(socket_path).unlink()
+
+    with TargetRunServer(socket_path, TargetRunHandler) as server:
+        server.serve_forever()
+
+if __name__=='__main__':
+    serve(instance_folders = sys.argv[1:])
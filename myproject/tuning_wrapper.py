@@ -1,7 +1,8 @@
 #!/home/damian/anaconda3/envs/ma-code/bin/python
 
 ###############################################################################
-# This script is the command that is executed every run.
+# This script can be executed every run, target_runner.py takes the same
+# arguments with fewer imports and is what the tuners call by default.
 # Check the examples in examples/
 #
 # This script is run in the execution directory (execDir, --exec-dir).
@@ -18,20 +19,20 @@
 # Exit with 0 if no error, with 1 in case of error
 ###############################################################################
 
-from myproject.helpers import ctun_fname, params2dict, separate_cfg_term_opt
+from myproject.helpers import ctun_fname, params2dict
+from myproject.target_runner import target_run
+from myproject.runcache import evict
 import sys
 import os
 
 from pathlib import Path
-from rpy2 import robjects
-import pandas as pd
-
-from myproject.metaheuristic.sa import sa
-from myproject.metaheuristic.aco import aco
-from myproject.metaheuristic.ga import ga
 
 SMAC_EXECUTABLE = 'smac-v2.10.03-master-778/smac'
 
+# scripts called by the tuners for every run, target_runner_client.py hands the runs to a running target_runner_server.py
+SMAC_TARGET_RUNNER = './myproject/target_runner.py'
+IRACE_TARGET_RUNNER = '/home/damian/Desktop/MA/macode/myproject/target_runner.py'
+
 def dict2params(asdict):
     cand_params = []
     for i in range(0, len(asdict)):
@@ -63,11 +64,11 @@ def smac_add_fixed_params(pcs_file: str, algorithm: str, optimize: str, terminat
     # set termination condition lines
     for key in terminate:
         if key == 'noimprovement':
-            temperatures = terminate['noimprovement']['temperatures']
-            accportion = terminate['noimprovement']['accportion']
             lines.append('term_noimprovement categorical {True}[True]\n')
-            lines.append('term_noimpr_temp_val categorical {{{value}}}[{value}]\n'.format(value = temperatures))
-            lines.append('term_noimpr_accp_val categorical {{{value}}}[{value}]\n'.format(value = accportion))
+            for subkey, param in [('temperatures', 'temp'), ('accportion', 'accp'), ('generations', 'gen')]:
+                if subkey in terminate['noimprovement']:
+                    value = terminate['noimprovement'][subkey]
+                    lines.append('term_noimpr_{param}_val categorical {{{value}}}[{value}]\n'.format(param = param, value = value))
         else:
             lines.append('term_{param} categorical {{True}}[True]\n'.format(param = key))
             lines.append('term_{param}_val categorical {{{value}}}[{value}]\n'.format(param = key, value = terminate[key]))
@@ -81,8 +82,10 @@ def smac(budget: int,
             terminate: dict,
             optimize: str,
             train_instances_dir: str,
-            outdir_suffix: str = '') -> None:
+            outdir_suffix: str = '',
+            target_runner: str = SMAC_TARGET_RUNNER) -> None:
 
+    evict() # the target runs look up and store their results in the run cache
     outdir = 'myproject/data/smac/' + ctun_fname(budget, algorithm, terminate, optimize, outdir_suffix)
     if not Path(outdir).exists():
         Path(outdir).mkdir()
@@ -93,8 +96,8 @@ def smac(budget: int,
                  --validation false --num-seeds-per-test-instance 1 \
             --numberOfRunsLimit %i --runObj QUALITY --pcs-file %s \
             --algo-deterministic False --outdir "%s"\
-            --algo "python3 ./myproject/tuning_wrapper.py"''' \
-            % (SMAC_EXECUTABLE, train_instances_dir, budget, pcs_file, outdir)
+            --algo "python3 %s"''' \
+            % (SMAC_EXECUTABLE, train_instances_dir, budget, pcs_file, outdir, target_runner)
     
     os.system(call)
 
@@ -103,8 +106,12 @@ def irace(budget: int,
             initial_parameters: dict,
             terminate: dict, 
             optimize: str,
-            train_instances_dir: str):
+            train_instances_dir: str,
+            target_runner: str = IRACE_TARGET_RUNNER):
+    from rpy2 import robjects
+    import pandas as pd
 
+    evict() # the target runs look up and store their results in the run cache
     robjects.r('library("irace")')
 
     # define scenario
@@ -112,7 +119,7 @@ def irace(budget: int,
     robjects.r('scenario$trainInstancesDir = \"' + train_instances_dir + '\"')
     robjects.r('scenario$trainInstancesFile = \"' + train_instances_dir + '/trainInstancesFile\"')
     robjects.r('scenario$maxExperiments = ' + str(budget))
-    robjects.r('scenario$targetRunner = "/home/damian/Desktop/MA/macode/myproject/tuning_wrapper.py"')
+    robjects.r('scenario$targetRunner = "%s"' % target_runner)
 
     logfile = 'myproject/data/irace/' + ctun_fname(budget, algorithm, terminate, optimize) + '.Rdata'
     robjects.r('scenario$logFile = "%s"' % logfile)
@@ -148,6 +155,8 @@ def irace(budget: int,
     robjects.r('parameters$domain$optimize = \"' + optimize + '\"')
 
     # initial configuration. also include termination condition and optimization criterion
+    if algorithm == 'ACO' and 'cand_list_size' not in initial_parameters:
+        initial_parameters['cand_list_size'] = 0 # default configurations sample from all nodes
     initial_parameters['algorithm'] = algorithm
     initial_parameters['optimize'] = optimize
     finitial_configuration = ('myproject/tuning-settings/config-irace-' + algorithm.lower() + '-initial-parameters.txt')
@@ -162,40 +171,5 @@ if __name__=='__main__':
         print("\nUsage: ./target-runner.py <configuration_id> <instance_id> <seed> <instance_path_name> <list of parameters>\n")
         sys.exit(1)
 
-    # Get the parameters as command line arguments.
-    tuner = None
-    instance = None 
-    lparams = None
-
-    # case differentiation between smac and irace
-    if (Path(sys.argv[4]).exists()):
-        # called by irace 
-        tuner = 'irace'
-        instance = sys.argv[4]
-        lparams = sys.argv[5:]
-    elif (Path(sys.argv[1]).exists()):
-        # called by smac
-        tuner = 'SMAC'
-        instance = sys.argv[1]
-        lparams = sys.argv[6:]
-
-    # Tuned parameters
-    dparams = params2dict(lparams)
-    algorithm = dparams.pop('algorithm')
-    cfg, terminate, optimize = separate_cfg_term_opt(dparams)
-                  
-    # Run runner
-    result = None
-    if algorithm == 'SA':
-        result = sa(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = None)
-    elif algorithm == 'ACO':
-        result = aco(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = None)
-    elif algorithm == 'GA':
-        result = ga(instance = instance, cfg = cfg, terminate = terminate, fname_convdata = None)
-
-    if tuner == 'irace':
-        print(result[optimize])
-    elif tuner == 'SMAC':
-        print('Result of this algorithm run: %s, %f, %i, %f, %i, %s' % ('SUCCESS', result['time'], result['evals'], result[optimize], 1, 0) )
-    
-    sys.exit(0)
\ No newline at end of file
+    print(target_run(sys.argv[1:]))
+    sys.exit(0)